@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import random
+import platform
+import tempfile
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+
+import genFont
+
+FAS_FILE = 'yufanxiliu.fas.json'
+BENCH_FILE = 'bench_result.json'
+STAGES = ['getCharData', 'getStrucView', 'components', 'toStrokes', 'removeOverlap', 'writeTempGlyphFromContours']
+
+# Components use integer grid coordinates, struc_data uses normalized ones
+def componentRecord(comp):
+    xs = [kp['point'][0] for path in comp['key_paths'] for kp in path['points']] or [0]
+    ys = [kp['point'][1] for path in comp['key_paths'] for kp in path['points']] or [0]
+    width = max(max(xs), 1)
+    height = max(max(ys), 1)
+    paths = []
+    for path in comp['key_paths']:
+        paths.append({ 'points': [{
+            'p_type': kp['p_type'],
+            'point': [0.1 + 0.8 * kp['point'][0] / width, 0.1 + 0.8 * kp['point'][1] / height]
+        } for kp in path['points']] })
+    return { 'comb': { 'key_paths': paths }, 'info': { 'scale': { 'h': 0.8 / width, 'v': 0.8 / height } } }
+
+# Dense characters made of four components, one per quadrant
+def syntheticRecords(records, num, seed=0):
+    rnd = random.Random(seed)
+    pool = list(records.values())
+    result = {}
+    for n in range(num):
+        paths = []
+        parts = rnd.sample(pool, 4)
+        for i, rec in enumerate(parts):
+            offsetX = (i % 2) * 0.5
+            offsetY = (i // 2) * 0.5
+            for path in rec['comb']['key_paths']:
+                paths.append({ 'points': [{
+                    'p_type': kp['p_type'],
+                    'point': [offsetX + kp['point'][0] / 2, offsetY + kp['point'][1] / 2]
+                } for kp in path['points']] })
+        scale = { 'h': parts[0]['info']['scale']['h'] / 2, 'v': parts[0]['info']['scale']['v'] / 2 }
+        result['synthetic_%d' % n] = { 'comb': { 'key_paths': paths }, 'info': { 'scale': scale } }
+    return result
+
+def loadCorpus(fasFile, syntheticNum, dataFile=None):
+    if dataFile:
+        data = genFont.loadStrucData(dataFile)
+        return { name: data[name] for name in data }
+
+    comps = genFont.loadJson(fasFile)['components']
+    records = { name: componentRecord(comp) for name, comp in comps.items() }
+    records.update(syntheticRecords(records, syntheticNum))
+    return records
+
+# Runs the outline stage of a build, genGlyphOutlines with its component cache and overlap removal
+def runCorpus(records, outDir, timings=None, removeOverlaps=False):
+    # Every pass starts with an empty component cache like a build does
+    genFont.setComponentCache(genFont.COMPONENT_CACHE_SIZE)
+    errors = 0
+    for item in records.items():
+        t0 = time.perf_counter()
+        _, results, stageTimes = genFont.genGlyphOutlines(item, genFont.TEST_GLYPH_OFFSET, removeOverlaps=removeOverlaps)
+        t1 = time.perf_counter()
+        contours, error = results[0]
+        if error is not None:
+            errors += 1
+        genFont.writeTempGlyphFromContours(contours, os.path.join(outDir, 'bench.svg'), 'svg', genFont.GLYPH_ATTRIB)
+        t2 = time.perf_counter()
+
+        if timings is not None:
+            for stage in STAGES[:-1]:
+                timings[stage].append(stageTimes.get(stage, 0.0))
+            timings['writeTempGlyphFromContours'].append(t2 - t1)
+            timings['glyph'].append(t2 - t0)
+    return errors
+
+def stageReport(samples):
+    total = sum(samples)
+    report = {
+        'count': len(samples),
+        'total': total,
+        'throughput': len(samples) / total if total else None,
+        'max': max(samples),
+    }
+    if len(samples) > 1:
+        q = statistics.quantiles(samples, n=100, method='inclusive')
+        report.update({ 'p50': q[49], 'p90': q[89], 'p99': q[98] })
+    else:
+        report.update({ 'p50': samples[0], 'p90': samples[0], 'p99': samples[0] })
+    return report
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(records, repeat=1, removeOverlaps=False):
+    timings = { stage: [] for stage in STAGES + ['glyph'] }
+    with tempfile.TemporaryDirectory() as outDir:
+        # Timing and memory are measured in separate passes, tracemalloc slows everything down
+        for n in range(repeat):
+            runCorpus(records, outDir, timings, removeOverlaps)
+
+        tracemalloc.start()
+        errors = runCorpus(records, outDir, removeOverlaps=removeOverlaps)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    cache = genFont.componentCache()
+    glyphTimes = timings.pop('glyph')
+    return {
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'glyphs': len(records),
+        'errors': errors,
+        'repeat': repeat,
+        'component_cache': genFont.COMPONENT_CACHE_SIZE,
+        'component_stats': dict(cache.stats) if cache is not None else None,
+        'remove_overlaps': removeOverlaps,
+        # Stages a configuration does not run, like removeOverlap, are left out
+        'stages': { stage: stageReport(samples) for stage, samples in timings.items() if any(samples) },
+        'glyph': stageReport(glyphTimes),
+        'peak_memory': peak,
+    }
+
+def printReport(result, base=None):
+    print("commit %s, %d glyphs (%d with errors), peak memory %.1f MiB" % (result['commit'], result['glyphs'], result['errors'], result['peak_memory'] / 1024 / 1024))
+    if result['component_stats']:
+        print("component cache: %(hits)d hits, %(misses)d misses, %(crowded)d crowded" % result['component_stats'])
+    print("%-26s %10s %10s %10s %10s %10s" % ('stage', 'glyphs/s', 'p50 ms', 'p90 ms', 'p99 ms', 'vs base'))
+    for stage, report in list(result['stages'].items()) + [('total', result['glyph'])]:
+        change = ''
+        if base is not None:
+            baseReport = base['glyph'] if stage == 'total' else base['stages'].get(stage)
+            if baseReport and baseReport['throughput'] and report['throughput']:
+                change = '%+.1f%%' % ((report['throughput'] / baseReport['throughput'] - 1) * 100)
+        print("%-26s %10.1f %10.3f %10.3f %10.3f %10s" % (stage, report['throughput'] or 0, report['p50'] * 1000, report['p90'] * 1000, report['p99'] * 1000, change))
+    if base is not None:
+        print("peak memory vs base %+.1f%%" % ((result['peak_memory'] / base['peak_memory'] - 1) * 100))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the glyph geometry pipeline of genFont.py')
+    parser.add_argument('--fas', default=FAS_FILE, help='component file used as corpus')
+    parser.add_argument('--data', help='benchmark a struc_data file instead of the components')
+    parser.add_argument('--synthetic', type=int, default=400, help='number of synthetic four-component glyphs')
+    parser.add_argument('--repeat', type=int, default=1, help='timed passes over the corpus, at least 1')
+    parser.add_argument('-o', '--output', default=BENCH_FILE, help='json file the results are written to')
+    parser.add_argument('--compare', metavar='FILE', help='earlier result to compare against')
+    parser.add_argument('--component-cache', type=int, default=genFont.COMPONENT_CACHE_SIZE, help='size of the component cache, off (0) by default')
+    parser.add_argument('--remove-overlaps', action='store_true', help='remove overlaps per glyph with skia-pathops like the font builds')
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+
+    genFont.setComponentCache(args.component_cache)
+
+    records = loadCorpus(args.fas, args.synthetic, args.data)
+    result = benchmark(records, args.repeat, args.remove_overlaps)
+    base = genFont.loadJson(args.compare) if args.compare else None
+    printReport(result, base)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
@@ -4,7 +4,23 @@ import json
 import math
 import copy
 import re
-from functools import reduce
+import zlib
+import struct
+import array
+import bisect
+import sqlite3
+import hashlib
+import inspect
+import time
+import contextlib
+import argparse
+import plistlib
+import itertools
+import multiprocessing
+import multiprocessing.connection
+from functools import reduce, partial
+from collections import deque
+from collections.abc import Mapping
 
 sys.path.append('clsvg')
 from clsvg import svgfile
@@ -22,17 +38,462 @@ GLYPH_ATTRIB = {
 TEMP_GLYPH_FILE = 'tempGlyph.svg'
 FONT_SIZE = 1024
 STROKE_WIDTH = 32
+DEFAULT_WEIGHTS = ((None, STROKE_WIDTH, None),)
 GLYPFH_WIDTH = 0.76
 CHAR_WIDTH = 860
 FONT_VARSION = "1.0"
 DATA_FILE = "./struc_data/struc_data.json"
+DATA_BIN_FILE = "./struc_data/struc_data.bin"
+DATA_BIN_MAGIC = b'YFSD'
+DATA_BIN_VERSION = 1
 TEST_GLYPHS_DIR = './test_glyphs'
+OUTLINE_CACHE_FILE = './outline_cache.db'
+OUTLINE_CACHE_SIZE = 256 * 1024 * 1024
+OUTLINE_CACHE_BATCH = 64
+OUTLINE_CACHE_TIMEOUT = 60
+OUTLINE_WINDOW = 64
+DEFAULT_GLYPH_TIME_BUDGET = 60
+GLYPH_TIME_BUDGET = None
+SUPERVISOR_PREFETCH = 4
+COMPONENT_CACHE_SIZE = 0
+COMPONENT_CACHE = None
+OUTLINE_SOURCES = None
+SFD_FILE = 'config.sfd'
+EXPORT_LOG_FILE = 'export_log.jsonl'
+PROFILE_FILE = './build_profile.json'
+PROFILE = None
+GLYPH_OFFSET = (CHAR_WIDTH - FONT_SIZE * GLYPFH_WIDTH) / 2
+TEST_GLYPH_OFFSET = FONT_SIZE * (1-GLYPFH_WIDTH) / 2
 SYMBOLS_DIR = 'symbols'
+SYMBOL_CACHE_FILE = './symbol_cache.json.z'
+SUBSET_NAME = 'subset'
+OVERLAP_REMOVAL = 'auto'
 
 def loadJson(file):
     with open(file, 'r', encoding='utf-8') as f:
         return json.load(f)
+
+# Binary struc_data layout (little endian):
+#   header  magic, version u16, unit u32, type count u16, record count u32
+#   types   u8 length + utf-8 name of every p_type
+#   index   u8 length + utf-8 char, u32 offset, u32 length of every record
+#   record  f64 scale h, f64 scale v, u16 path count,
+#           then per path u16 point count, u8 p_type per point, i32 x/y pairs
+# Coordinates are stored multiplied by unit and rounded, the same rounding
+# getCharData applies, so records read back at scale=unit are exact.
+def compileStrucData(jsonFile, binFile, unit=FONT_SIZE):
+    data = loadJson(jsonFile)
+    types = []
+    records = []
+    for name, attrs in data.items():
+        paths = attrs['comb']['key_paths']
+        buf = [struct.pack('<ddH', attrs['info']['scale']['h'], attrs['info']['scale']['v'], len(paths))]
+        for path in paths:
+            points = path['points']
+            pTypes = array.array('B')
+            coords = array.array('i')
+            for kp in points:
+                if kp['p_type'] not in types:
+                    types.append(kp['p_type'])
+                pTypes.append(types.index(kp['p_type']))
+                coords.append(round(kp['point'][0] * unit))
+                coords.append(round(kp['point'][1] * unit))
+            if sys.byteorder != 'little':
+                coords.byteswap()
+            buf.append(struct.pack('<H', len(points)))
+            buf.append(pTypes.tobytes())
+            buf.append(coords.tobytes())
+        records.append((name.encode('utf-8'), b''.join(buf)))
+
+    head = [DATA_BIN_MAGIC, struct.pack('<HIHI', DATA_BIN_VERSION, unit, len(types), len(records))]
+    for t in types:
+        t = t.encode('utf-8')
+        head.append(struct.pack('<B', len(t)) + t)
+    indexSize = sum(5 + len(name) + 4 for name, _ in records)
+    offset = sum(len(b) for b in head) + indexSize
+    for name, rec in records:
+        head.append(struct.pack('<B', len(name)) + name + struct.pack('<II', offset, len(rec)))
+        offset += len(rec)
+
+    with open(binFile, 'wb') as f:
+        f.write(b''.join(head))
+        for _, rec in records:
+            f.write(rec)
+
+class StrucData(Mapping):
+    def __init__(self, file):
+        self.file = open(file, 'rb')
+        if self.file.read(4) != DATA_BIN_MAGIC:
+            raise ValueError('%s is not a compiled struc_data file' % file)
+        version, self.unit, typeNum, num = struct.unpack('<HIHI', self.file.read(12))
+        if version != DATA_BIN_VERSION:
+            raise ValueError('%s has unsupported version %d' % (file, version))
+        self.types = []
+        for i in range(typeNum):
+            size = self.file.read(1)[0]
+            self.types.append(self.file.read(size).decode('utf-8'))
+        self.index = {}
+        for i in range(num):
+            size = self.file.read(1)[0]
+            name = self.file.read(size).decode('utf-8')
+            self.index[name] = struct.unpack('<II', self.file.read(8))
+
+    def __getitem__(self, name):
+        offset, size = self.index[name]
+        self.file.seek(offset)
+        buf = self.file.read(size)
+        scaleH, scaleV, pathNum = struct.unpack_from('<ddH', buf)
+        pos = 18
+        paths = []
+        for i in range(pathNum):
+            pointNum = struct.unpack_from('<H', buf, pos)[0]
+            pos += 2
+            pTypes = buf[pos:pos + pointNum]
+            pos += pointNum
+            coords = array.array('i', buf[pos:pos + pointNum * 8])
+            if sys.byteorder != 'little':
+                coords.byteswap()
+            pos += pointNum * 8
+            paths.append({ 'points': [{ 'p_type': self.types[pTypes[j]], 'point': [coords[j*2] / self.unit, coords[j*2+1] / self.unit] } for j in range(pointNum)] })
+        return { 'comb': { 'key_paths': paths }, 'info': { 'scale': { 'h': scaleH, 'v': scaleV } } }
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self.file.close()
+
+# Lazily decoded json struc_data. The byte span of every top-level record
+# is found once and kept in a sidecar index, so later lookups only read and
+# decode the records they ask for.
+class JsonStrucData(Mapping):
+    def __init__(self, file):
+        stat = os.stat(file)
+        indexFile = file + '.idx'
+        self.index = None
+        if os.path.exists(indexFile):
+            try:
+                cached = loadJson(indexFile)
+                if cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+                    self.index = { name: tuple(span) for name, span in cached['index'] }
+            except (ValueError, KeyError):
+                pass
+        if self.index is None:
+            self.index = self.scan(file)
+            try:
+                with open(indexFile, 'w', encoding='utf-8') as f:
+                    json.dump({ 'size': stat.st_size, 'mtime': stat.st_mtime, 'index': list(self.index.items()) }, f, ensure_ascii=False)
+            except OSError:
+                pass
+        self.file = open(file, 'rb')
+
+    @staticmethod
+    def scan(file):
+        with open(file, 'r', encoding='utf-8') as f:
+            text = f.read()
+        decoder = json.JSONDecoder()
+        space = re.compile(r'[ \t\n\r]*')
+        index = {}
+        pos = space.match(text, 0).end()
+        if text[pos] != '{':
+            raise ValueError('%s is not a json object' % file)
+        pos = space.match(text, pos + 1).end()
+        charPos = 0
+        bytePos = 0
+        def toByte(i):
+            nonlocal charPos, bytePos
+            bytePos += len(text[charPos:i].encode('utf-8'))
+            charPos = i
+            return bytePos
+        while text[pos] != '}':
+            name, pos = decoder.raw_decode(text, pos)
+            pos = space.match(text, pos).end()
+            pos = space.match(text, pos + 1).end() # ':'
+            start = pos
+            _, pos = decoder.raw_decode(text, pos)
+            begin = toByte(start)
+            index[name] = (begin, toByte(pos) - begin)
+            pos = space.match(text, pos).end()
+            if text[pos] == ',':
+                pos = space.match(text, pos + 1).end()
+        return index
+
+    def __getitem__(self, name):
+        offset, size = self.index[name]
+        self.file.seek(offset)
+        return json.loads(self.file.read(size).decode('utf-8'))
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self.file.close()
+
+# chars limits the data to the chars of a subset build
+def loadStrucData(file, chars=None):
+    with open(file, 'rb') as f:
+        isBin = f.read(4) == DATA_BIN_MAGIC
+    data = StrucData(file) if isBin else JsonStrucData(file)
+    if chars is not None:
+        data = SubsetStrucData(data, chars)
+    return data
+
+# The records of some chars, in the order of the full data
+class SubsetStrucData(Mapping):
+    def __init__(self, data, chars):
+        self.data = data
+        self.names = [name for name in data if name in chars]
+        self.known = set(self.names)
+
+    def __getitem__(self, name):
+        if name not in self.known:
+            raise KeyError(name)
+        return self.data[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+def parseCodepoint(text):
+    text = text.strip()
+    if text[:2].upper() in ('U+', '0X'):
+        text = text[2:]
+    return int(text, 16)
+
+# Chars of a subset build: the visible chars of the text files and the code points of
+# the lists, hex with an optional U+ or 0x, single or as first-last ranges, separated
+# by commas or spaces. A list starting with @ is read from the file named after it.
+def subsetChars(textFiles=(), codepoints=()):
+    chars = set()
+    for file in textFiles:
+        with open(file, 'r', encoding='utf-8') as f:
+            chars.update(c for c in f.read() if c.isprintable() and not c.isspace())
+    for codes in codepoints:
+        if codes.startswith('@'):
+            with open(codes[1:], 'r', encoding='utf-8') as f:
+                codes = f.read()
+        for part in re.split(r'[\s,]+', codes):
+            if not part:
+                continue
+            first, _, last = part.partition('-')
+            start = parseCodepoint(first)
+            chars.update(chr(code) for code in range(start, parseCodepoint(last) + 1 if last else start + 1))
+    return chars
+
+def subsetReport(chars, data, symbols):
+    missing = sorted(chars - set(data) - set(symbols))
+    print("subset: %d glyphs, %d symbols, %d chars without a glyph%s" % (len(data), len(symbols), len(missing), (': ' + ''.join(missing[:64])) if missing else ''))
     
+# Stroke styles per direction, read-only once compiled. '26' is the hook of
+# the 2-6-8 pattern and '36' the 3-6 stroke ending a path.
+class StrokeStyle(dict):
+    def __init__(self, table=()):
+        super().__init__((key, freezeStyle(value)) for key, value in dict(table).items())
+
+    def readOnly(self, *args, **kwargs):
+        raise TypeError('stroke styles are read-only')
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = readOnly
+
+    def __reduce__(self):
+        return (StrokeStyle, (dict(self),))
+
+def freezeStyle(value):
+    if isinstance(value, dict):
+        return StrokeStyle(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(freezeStyle(v) for v in value)
+    return value
+
+# A style file only holds the entries it changes, tables are merged into the defaults
+# key by key and lists of tables item by item
+def loadStrokeStyles(file):
+    return StrokeStyle(mergeStyle(STROKE_STYLES, loadJson(file)))
+
+def mergeStyle(base, override):
+    if isinstance(base, dict) and isinstance(override, dict):
+        merged = dict(base)
+        for key, value in override.items():
+            merged[key] = mergeStyle(base[key], value) if key in base else value
+        return merged
+    if isinstance(base, tuple) and isinstance(override, list) and all(isinstance(v, dict) for v in base):
+        merged = [mergeStyle(table, value) for table, value in zip(base, override)]
+        return merged + list(base[len(override):]) + override[len(base):]
+    return override
+
+STROKE_STYLES = StrokeStyle({
+    '6': {
+        'length': 32,
+        'h': [],
+        'v': [
+            12,
+        ],
+        'end': {
+            'length': 64,
+            'h': [
+                24,
+            ],
+            'v': [
+                18,
+                12
+            ],
+        },
+        'end_2': {
+            'length': 64,
+            'h': [
+                18,
+                14
+            ],
+            'v': [
+                18,
+                34,
+                16
+            ],
+        }
+    },
+    '2': {
+        'length': 64,
+        'h': [
+            16,
+            8,
+            8
+        ],
+        'v': [
+            12,
+            12
+        ],
+        'end': {
+            'length': 48,
+            'h': [
+                24,
+            ],
+            'v': [
+                12
+            ],
+        }
+    },
+    '26': [
+        {
+            'h':[
+                28,
+                4
+            ],
+            'v':[
+                30,
+                24,
+                10
+            ]
+        },
+        {
+            'h':[
+                6,
+                42,
+                12
+            ],
+            'v':[
+                10
+            ]
+        },
+    ],
+    '1': {
+        'length': 42,
+        'h': [
+            18
+        ],
+        'v': [
+            24,
+            32
+        ],
+        'end': {
+            'h': [
+                20,
+                16,
+                8
+            ],
+            'v': [
+                6,
+                28
+            ]
+        }
+    },
+    '36': {
+        'length': 54
+    },
+    '3': {
+        'length': 48,
+        'h': [],
+        'v': [
+            14
+        ],
+        'start_1': 
+        {
+            'h':[
+                20,
+                8
+            ],
+            'v':[
+                12,
+                16,
+                4
+            ]
+        }
+    },
+    '4': {
+        'length': 120,
+        'h': [
+            4,
+        ],
+        'v': [
+            18,
+            10,
+            10
+        ],
+    },
+    '9': {
+        'start': [
+            {
+                'length': 64,
+                'h': [
+                    36
+                ],
+                'v': [
+                    8,
+                    40
+                ],
+            },
+            {
+                'h': [
+                    24,
+                    40,
+                    4,
+                    16
+                ],
+                'v': [
+                    6,
+                    36
+                ],
+            }
+        ],
+        'end': {
+            'length': 64,
+            'h': [
+                18
+            ],
+            'v': [
+                34,
+                18
+            ],
+        }
+    },
+})
+
 def lineSymbol(p1, p2):
     if p1.x == p2.x:
         return 'v'
@@ -40,6 +501,14 @@ def lineSymbol(p1, p2):
         return 'h'
     else:
         return 'd'
+
+def ctrlSymbol(pos):
+    if pos.x == 0:
+        return 'v'
+    elif pos.y == 0:
+        return 'h'
+    else:
+        return 'd'
     
 def getCharData(data, scale=1):
     p_map = {'h': set(), 'v': set()}
@@ -56,11 +525,12 @@ def getCharData(data, scale=1):
                 break
         if isHide: continue
 
+        # Key points stay plain (x, y) tuples until the bezier paths are built
         for kp in list['points']:
-            pos = bs.Point(round(kp['point'][0] * scale), round(kp['point'][1] * scale))
+            pos = (round(kp['point'][0] * scale), round(kp['point'][1] * scale))
             if pos != prep:
-                p_map['h'].add(pos.x)
-                p_map['v'].add(pos.y)
+                p_map['h'].add(pos[0])
+                p_map['v'].add(pos[1])
                 path.append(pos)
                 prep = pos
         
@@ -105,8 +575,8 @@ def getCharData(data, scale=1):
     for i, points in enumerate(path_list):
         if i not in map_to:
             bp = bs.BezierPath()
-            bp.start(points[0])
-            bp.extend([bs.BezierCtrl(points[j] - points[j-1]) for j in range(1, len(points))])
+            bp.start(bs.Point(*points[0]))
+            bp.extend([bs.BezierCtrl(bs.Point(points[j][0] - points[j-1][0], points[j][1] - points[j-1][1])) for j in range(1, len(points))])
             if points[0] == points[-1]:
                 bp.close()
             bpaths.append(bp)
@@ -114,6 +584,8 @@ def getCharData(data, scale=1):
     scale = data["info"]["scale"]
     p_map['h'] = sorted(p_map['h'])
     p_map['v'] = sorted(p_map['v'])
+    p_map['h_index'] = { v: i for i, v in enumerate(p_map['h']) }
+    p_map['v_index'] = { v: i for i, v in enumerate(p_map['v']) }
 
     return scale, p_map, bpaths
 
@@ -146,60 +618,157 @@ def strokeDirection(bpath):
 
     return text
 
+# Sparse structure view: only occupied grid cells are stored. Every segment
+# contributes three records (start, end and padding) shared by the cells
+# it covers, and each cell keeps them in insertion order.
+class StrucView:
+    __slots__ = ('width', 'height', 'cells', 'index')
+    EMPTY = ()
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = {}
+        self.index = None
+
+    def add(self, x, y, attrs):
+        cell = self.cells.get((x, y))
+        if cell is None:
+            self.cells[(x, y)] = [attrs]
+        else:
+            cell.append(attrs)
+
+    def cell(self, x, y):
+        return self.cells.get((x, y), self.EMPTY)
+
+    # Sorted occupancy per row ('x' axis, keyed by y) and per column ('y' axis,
+    # keyed by x) for three kinds of cells: 'any' occupied cell, 'solid' cells
+    # holding a non diagonal record and 'block' cells holding anything but
+    # diagonal padding.
+    def buildIndex(self):
+        index = {}
+        for (x, y), cell in self.cells.items():
+            kinds = ['any']
+            if any(attrs['symbol'] != 'd' for attrs in cell):
+                kinds.append('solid')
+            if any(attrs['symbol'] != 'd' or not attrs['padding'] for attrs in cell):
+                kinds.append('block')
+            for kind in kinds:
+                index.setdefault((kind, 'x', y), []).append(x)
+                index.setdefault((kind, 'y', x), []).append(y)
+        for positions in index.values():
+            positions.sort()
+        self.index = index
+
+    def positions(self, kind, axis, line):
+        if self.index is None:
+            self.buildIndex()
+        return self.index.get((kind, axis, line), self.EMPTY)
+
+    # First occupied position from start to end inclusive, walking in dirn
+    def first(self, kind, axis, line, start, end, dirn):
+        positions = self.positions(kind, axis, line)
+        if dirn > 0:
+            k = bisect.bisect_left(positions, start)
+            if k < len(positions) and positions[k] <= end:
+                return positions[k]
+        else:
+            k = bisect.bisect_right(positions, start) - 1
+            if k >= 0 and positions[k] >= end:
+                return positions[k]
+        return None
+
+    # Nearest occupied position strictly past start in dirn
+    def nearest(self, kind, axis, line, start, dirn):
+        if dirn > 0:
+            return self.first(kind, axis, line, start + 1, math.inf, dirn)
+        else:
+            return self.first(kind, axis, line, start - 1, -math.inf, dirn)
+
+    # Occupied positions from start inclusive, in walking order
+    def walk(self, kind, axis, line, start, dirn):
+        positions = self.positions(kind, axis, line)
+        if dirn > 0:
+            return positions[bisect.bisect_left(positions, start):]
+        else:
+            return reversed(positions[:bisect.bisect_right(positions, start)])
+
 def getStrucView(bpaths, p_map):
-    def map_x(v):
-        return p_map['h'].index(v)
-    def map_y(v):
-        return p_map['v'].index(v)
+    map_x = p_map['h_index']
+    map_y = p_map['v_index']
 
-    view = [[[] for n in range(len(p_map['h']))] for m in range(len(p_map['v']))]
+    view = StrucView(len(p_map['h']), len(p_map['v']))
 
     for i, path in enumerate(bpaths):
         start = path.startPos()
-        prePos = bs.Point(map_x(start.x), map_y(start.y))
+        posX, posY = start.x, start.y
+        preX = map_x[posX]
+        preY = map_y[posY]
         for j, ctrl in enumerate(path):
-            sym = lineSymbol(bs.Point(), ctrl.pos)
-            attrs = {
+            pos = ctrl.pos
+            sym = ctrlSymbol(pos)
+            dir = direction(pos)
+            indexes = [i, j]
+            view.add(preX, preY, {
                 'symbol': sym,
-                'indexes': [i, j],
+                'indexes': indexes,
                 'padding': False,
-                'dir': direction(ctrl.pos),
+                'dir': dir,
                 'se': 0
-            }
-            view[prePos.y][prePos.x].append(attrs)
-            start += ctrl.pos
-            currPos = bs.Point(map_x(start.x), map_y(start.y))
-            attrs = {
+            })
+            posX += pos.x
+            posY += pos.y
+            currX = map_x[posX]
+            currY = map_y[posY]
+            view.add(currX, currY, {
                 'symbol': sym,
-                'indexes': [i, j],
+                'indexes': indexes,
                 'padding': False,
-                'dir': direction(ctrl.pos),
+                'dir': dir,
                 'se': 1
-            }
-            view[currPos.y][currPos.x].append(attrs)
+            })
 
             attrs = {
                 'symbol': sym,
-                'indexes': [i, j],
+                'indexes': indexes,
                 'padding': True
             }
             if sym == 'd':
-                for y in range(min(prePos.y, currPos.y)+1, max(prePos.y, currPos.y)):
-                    for x in range(min(prePos.x, currPos.x)+1, max(prePos.x, currPos.x)):
-                        if (y != prePos.y or x != prePos.x) and (y != currPos.y or x != currPos.x):
-                            view[y][x].append(attrs)
-            else:
-                if sym == 'h':
-                    for k in range(min(prePos.x, currPos.x) + 1, max(prePos.x, currPos.x)):
-                        view[currPos.y][k].append(attrs)
-                if sym == 'v':
-                    for k in range(min(prePos.y, currPos.y) + 1, max(prePos.y, currPos.y)):
-                        view[k][currPos.x].append(attrs)
-
-            prePos = currPos
+                for y in range(min(preY, currY)+1, max(preY, currY)):
+                    for x in range(min(preX, currX)+1, max(preX, currX)):
+                        view.add(x, y, attrs)
+            elif sym == 'h':
+                for k in range(min(preX, currX) + 1, max(preX, currX)):
+                    view.add(k, currY, attrs)
+            elif sym == 'v':
+                for k in range(min(preY, currY) + 1, max(preY, currY)):
+                    view.add(currX, k, attrs)
+
+            preX = currX
+            preY = currY
 
     return view
 
+# A skeleton pattern the stroke rules have no case for. dirs are the directions of the
+# previous, current and next segment ('*' past the ends) as strokeDirection spells them.
+class StrokeError(Exception):
+    def __init__(self, message, dirs=None, segment=None, path=None):
+        super().__init__(message, dirs, segment, path)
+        self.message = message
+        self.dirs = tuple(dirs) if dirs else None
+        self.segment = segment
+        self.path = path
+
+    def __str__(self):
+        text = self.message
+        if self.path is not None:
+            text += ' in path %d' % self.path
+        if self.segment is not None:
+            text += ' at segment %d' % self.segment
+        if self.dirs:
+            text += ' (%s)' % ' '.join(self.dirs)
+        return text
+
 def strokeCtrl(pos, prePos, nectPos, unit):
     if pos.x < 0:
         if pos.y > 0:
@@ -208,12 +777,12 @@ def strokeCtrl(pos, prePos, nectPos, unit):
                     corr = prePos.y * 0.5
                     p1 = bs.Point(0, corr + pos.y * 0.3)
                     return bs.BezierCtrl(pos + bs.Point(0, corr), p1=p1), corr
-                raise 'undefine'
+                raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
             if nectPos:
                 if nectPos.y > 0 and nectPos.x == 0:
                     corr = min(nectPos.y * 0.5, unit.y)
                     return bs.BezierCtrl(pos + bs.Point(0, corr), p2=bs.Point(pos.x, (pos.y+corr)/2))
-                raise 'undefine'
+                raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
             
             if abs(pos.x) < unit.x * 1.5:
                 return bs.BezierCtrl(pos)
@@ -226,7 +795,7 @@ def strokeCtrl(pos, prePos, nectPos, unit):
                 p2.y += (1 - abs(p2.y / p2.x)) * (pos.y - p2.y)
                 return bs.BezierCtrl(pos, p2=p2)
         else:
-            raise 'undefine'
+            raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
     else:
         if pos.y > 0:
             if prePos and nectPos:
@@ -236,13 +805,13 @@ def strokeCtrl(pos, prePos, nectPos, unit):
                     p2 = bs.Point(min(pos.x*2, (pos.x + nectPos.x)/2), pos.y + corr)
                     return bs.BezierCtrl(pos + bs.Point(nectPos.x, corr), p1=p1, p2=p2), corr
                 else:
-                    raise 'undefine'
+                    raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
             if prePos:
                 if prePos.y > 0 and prePos.x == 0:
                     corr = prePos.y * 0.5
                     p1 = bs.Point(0, corr + pos.y * 0.3)
                     return bs.BezierCtrl(pos + bs.Point(0, corr), p1=p1), corr
-                raise 'undefine'
+                raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
             if nectPos:
                 if nectPos.y > 0 and nectPos.x == 0:
                     corr = min(nectPos.y * 0.5, unit.y)
@@ -250,7 +819,7 @@ def strokeCtrl(pos, prePos, nectPos, unit):
                     return bs.BezierCtrl(pos + bs.Point(0, corr), p1=p1)
                 elif nectPos.x > 0 and nectPos.y == 0:
                     return bs.BezierCtrl(pos + nectPos, p1=pos)
-                raise 'undefine'
+                raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
             
             if abs(pos.x) < unit.x * 1.5:
                 return bs.BezierCtrl(pos)
@@ -263,11 +832,23 @@ def strokeCtrl(pos, prePos, nectPos, unit):
                 p2.y += pos.y * (1 - abs(p2.y / p2.x)) * 0.5
                 return bs.BezierCtrl(pos, p2=p2)
         else:
-            raise 'undefine'
-
-def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
-    def mapx(v): return p_map['h'].index(v)
-    def mapy(v): return p_map['v'].index(v)
+            raise StrokeError('undefined curve', (direction(prePos) if prePos else '*', direction(pos), direction(nectPos) if nectPos else '*'))
+
+def copySkeletonPath(bpath):
+    # Skeleton segments from getCharData are straight, so the end point is all there is to copy
+    start = bpath.startPos()
+    path = bs.BezierPath()
+    path.start(bs.Point(start.x, start.y))
+    path.extend([bs.BezierCtrl(bs.Point(ctrl.pos.x, ctrl.pos.y)) for ctrl in bpath])
+    if bpath.isClose():
+        path.close()
+    return path
+
+# The records sharing the cell of a key point of path npath, before and after its segment
+# nctrl, and for axis aligned tangents how far the stroke end is from the next stroke
+def strucInfo(view, p_map, strokeWidth, npath, pos, tangent, nctrl):
+    def mapx(v): return p_map['h_index'][v]
+    def mapy(v): return p_map['v_index'][v]
 
     def axis_value(x, y, axis, inverse):
         if axis == 'x':
@@ -283,129 +864,135 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
             
     def in_view(i, j, axis):
         if axis == 'x':
-            return view[i][j]
+            return view.cell(j, i)
         else:
-            return view[j][i]
-
-    def extendedInfo(pos, tangent, nctrl):
-        viewX = mapx(pos.x)
-        viewY = mapy(pos.y)
-        info = {
-            'front': [],
-            'back': [],
-        }
+            return view.cell(i, j)
 
-        find_self = False
-        for attrs in view[viewY][viewX]:
-            if attrs['indexes'][0] == npath and attrs['indexes'][1] == nctrl:
-                find_self = True
-                continue
-
-            if find_self:
-                info['back'].append(attrs)
-            else:
-                info['front'].append(attrs)
-
-        if tangent.x * tangent.y == 0:
-            if tangent.x == 0:
-                axis = 'y'
-                if tangent.y > 0:
-                    dirn = 1
-                else:
-                    dirn = -1
-            else:
-                axis = 'x'
-                if tangent.x > 0:
-                    dirn = 1
-                else:
-                    dirn = -1
-            
-            axis_list = p_map[axis_value('h', 'v', axis, False)]
-            inaxis_list = p_map[axis_value('h', 'v', axis, True)]
-            parallel_check = []
-
-            startV1 = axis_value(viewX, viewY, axis, True)
-            for advance in range(0, len(inaxis_list)):
-                distance = abs(inaxis_list[startV1] - inaxis_list[advance])
-                if distance <= STROKE_WIDTH / 2:
-                    parallel_check.append(advance)
-                elif inaxis_list[advance] > inaxis_list[startV1]:
-                    break
-            
-            startV2 = axis_value(viewX, viewY, axis, False)
-            j = startV2
-            while True:
-                for parVal in parallel_check:
-                    if parVal == startV1 and j == startV2:
-                        continue
-                    for attrs in in_view(parVal, j, axis):
-                        if attrs['symbol'] != 'd':# or not attrs['padding']:
-                            if j == startV2 and attrs['padding']:
-                                continue
-                            if j == startV2 and tangent.x == 0 and tangent.y > 0:
-                                continue
-                            distance = abs(axis_list[startV2] - axis_list[j])
-                            info['extend'] = distance
-                            break
-                    if 'extend' in info: break
-                if 'extend' in info: break
+    viewX = mapx(pos.x)
+    viewY = mapy(pos.y)
+    info = {
+        'front': [],
+        'back': [],
+    }
 
-                j += dirn
-                if j < 0 or j == len(axis_list):
-                    break
-            
-            j = startV2
-            while j >= 0 and j < len(axis_list):
-                for attrs in in_view(startV1, j, axis):
-                    if (attrs['symbol'] == 'd' and not attrs['padding']) or attrs['indexes'] != [npath, nctrl] or (attrs['indexes'] == [npath, nctrl] and not attrs['padding']):
-                        info['areaLen'] = abs(axis_list[startV2] - axis_list[j])
-                        j = -2
-                        break
+    find_self = False
+    for attrs in view.cell(viewX, viewY):
+        if attrs['indexes'][0] == npath and attrs['indexes'][1] == nctrl:
+            find_self = True
+            continue
 
-                j -= dirn
+        if find_self:
+            info['back'].append(attrs)
         else:
+            info['front'].append(attrs)
+
+    if tangent.x * tangent.y == 0:
+        if tangent.x == 0:
+            axis = 'y'
             if tangent.y > 0:
-                dirnY = 1
+                dirn = 1
             else:
-                dirnY = -1
+                dirn = -1
+        else:
+            axis = 'x'
             if tangent.x > 0:
-                dirnX = 1
+                dirn = 1
             else:
-                dirnX = -1
-
-            info['extend'] = [-1, -1]
-            find = [True, True]
-            y = viewY
-            x = viewX
-            while find[0] and find[1]:
-                y += dirnY
-                x += dirnX
-                if y < 0 or y == len(p_map['v']):
+                dirn = -1
+        
+        axis_list = p_map[axis_value('h', 'v', axis, False)]
+        inaxis_list = p_map[axis_value('h', 'v', axis, True)]
+        startV1 = axis_value(viewX, viewY, axis, True)
+        parallel_check = range(bisect.bisect_left(inaxis_list, inaxis_list[startV1] - strokeWidth / 2), bisect.bisect_right(inaxis_list, inaxis_list[startV1] + strokeWidth / 2))
+        
+        startV2 = axis_value(viewX, viewY, axis, False)
+        # The start cell filters out padding and downward strokes, beyond it any solid line blocks
+        if tangent.x != 0 or tangent.y <= 0:
+            for parVal in parallel_check:
+                if parVal == startV1:
+                    continue
+                for attrs in in_view(parVal, startV2, axis):
+                    if attrs['symbol'] != 'd' and not attrs['padding']:
+                        info['extend'] = 0
+                        break
+                if 'extend' in info: break
+        if 'extend' not in info:
+            nearest = None
+            for parVal in parallel_check:
+                j = view.nearest('solid', axis, parVal, startV2, dirn)
+                if j is not None and (nearest is None or abs(j - startV2) < abs(nearest - startV2)):
+                    nearest = j
+            if nearest is not None:
+                info['extend'] = abs(axis_list[startV2] - axis_list[nearest])
+        
+        for j in view.walk('any', axis, startV1, startV2, -dirn):
+            for attrs in in_view(startV1, j, axis):
+                if attrs['indexes'] != [npath, nctrl] or not attrs['padding']:
+                    info['areaLen'] = abs(axis_list[startV2] - axis_list[j])
+                    break
+            if 'areaLen' in info: break
+    else:
+        if tangent.y > 0:
+            dirnY = 1
+        else:
+            dirnY = -1
+        if tangent.x > 0:
+            dirnX = 1
+        else:
+            dirnX = -1
+
+        info['extend'] = [-1, -1]
+        find = [True, True]
+        y = viewY
+        x = viewX
+        while find[0] and find[1]:
+            y += dirnY
+            x += dirnX
+            if y < 0 or y == len(p_map['v']):
+                find[0] = False
+                y -= dirnY
+            if x < 0 or x == len(p_map['h']):
+                find[1] = False
+                x -= dirnX
+                
+            # Scan ends as range(start, end+1, dirn) did
+            if find[0]:
+                i = view.first('block', 'y', x, viewY, y if dirnY > 0 else y + 2, dirnY)
+                if i is not None:
+                    info['extend'][0] = abs(p_map['v'][viewY] - p_map['v'][i])
                     find[0] = False
-                    y -= dirnY
-                if x < 0 or x == len(p_map['h']):
+            if find[1]:
+                i = view.first('block', 'x', y, viewX, x if dirnX > 0 else x + 2, dirnX)
+                if i is not None:
+                    info['extend'][1] = abs(p_map['h'][viewX] - p_map['h'][i])
                     find[1] = False
-                    x -= dirnX
-                    
-                if find[0]:
-                    for i in range(viewY, y+1, dirnY):
-                        for attrs in view[i][x]:
-                            if attrs['symbol'] != 'd' or not attrs['padding']:
-                                distance = abs(p_map['v'][viewY] - p_map['v'][i])
-                                info['extend'][0] = distance
-                                find[0] = False
-                                break
-                        if not find[0]: break
-                if find[1]:
-                    for i in range(viewX, x+1, dirnX):
-                        for attrs in view[y][i]:
-                            if attrs['symbol'] != 'd' or not attrs['padding']:
-                                distance = abs(p_map['h'][viewX] - p_map['h'][i])
-                                info['extend'][1] = distance
-                                find[1] = False
-                                break
-                        if not find[1]: break
-        
+    
+    return info
+
+# The skeleton is never modified: the stroked path works on its own copy and
+# the other paths are only read
+# infoLog collects what extendedInfo saw, as (pos, tangent, nctrl, (front, back, extend, areaLen))
+def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths, styles=None, infoLog=None):
+    if styles is None:
+        styles = STROKE_STYLES
+    bpath = copySkeletonPath(bpath)
+
+    def skeletonPath(i):
+        return bpath if i == npath else bpaths[i]
+
+    def undefined(message='undefined stroke pattern'):
+        return StrokeError(message, (preDir, dir, nectDir), index, npath)
+
+    def curveCtrl(pos, prePos, nectPos):
+        try:
+            return strokeCtrl(pos, prePos, nectPos, unit)
+        except StrokeError as e:
+            raise undefined('%s %s' % (e.message, ' '.join(e.dirs))) from None
+
+    def extendedInfo(pos, tangent, nctrl):
+        info = strucInfo(view, p_map, strokeWidth, npath, pos, tangent, nctrl)
+        if infoLog is not None:
+            infoLog.append(((pos.x, pos.y), (tangent.x, tangent.y), nctrl, (list(info['front']), list(info['back']), copy.copy(info.get('extend')), info.get('areaLen'))))
         return info
 
     parallelPath = [bs.BezierPath(),  bs.BezierPath()]
@@ -424,35 +1011,7 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
         currPos = prePos + ctrl.pos
 
         if dir == '6':
-            STROKE = {
-                'length': 32,
-                'h': [],
-                'v': [
-                    12,
-                ],
-                'end': {
-                    'length': 64,
-                    'h': [
-                        24,
-                    ],
-                    'v': [
-                        18,
-                        12
-                    ],
-                },
-                'end_2': {
-                    'length': 64,
-                    'h': [
-                        18,
-                        14
-                    ],
-                    'v': [
-                        18,
-                        34,
-                        16
-                    ],
-                }
-            }
+            STROKE = styles['6']
 
             pathLen = ctrl.pos.x
             if preDir == '*':
@@ -477,21 +1036,21 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                                 break
                         if inOther: continue
 
-                        collPath = bpaths[attrs['indexes'][0]]
-                        if len(bpaths[attrs['indexes'][0]]) > 1 and collPath[attrs['indexes'][1]].pos.y > 0:
+                        collPath = skeletonPath(attrs['indexes'][0])
+                        if len(skeletonPath(attrs['indexes'][0])) > 1 and collPath[attrs['indexes'][1]].pos.y > 0:
                             if attrs['indexes'][1] > 0:
                                 tempCtrl = collPath[attrs['indexes'][1]-1].pos
                                 if direction(tempCtrl) == '2':
-                                    collCtrl, corr = strokeCtrl(collPath[attrs['indexes'][1]].pos, tempCtrl, None, unit)
+                                    collCtrl, corr = curveCtrl(collPath[attrs['indexes'][1]].pos, tempCtrl, None)
                                     collCtrlPos = collPath.posIn(attrs['indexes'][1])
                                     collCtrlPos.y -= corr
                                 else:
-                                    collCtrl = strokeCtrl(collPath[attrs['indexes'][1]].pos, None, None, unit)
+                                    collCtrl = curveCtrl(collPath[attrs['indexes'][1]].pos, None, None)
                                     collCtrlPos = collPath.posIn(attrs['indexes'][1])
                             else:
-                                raise 'undefine'
+                                raise undefined()
                         else:
-                            collCtrl = strokeCtrl(collPath[attrs['indexes'][1]].pos, None, None, unit)
+                            collCtrl = curveCtrl(collPath[attrs['indexes'][1]].pos, None, None)
                             collCtrlPos = collPath.posIn(attrs['indexes'][1])
 
                         [_, t] = collCtrl.intersections(collCtrlPos, ctrl, prePos)
@@ -504,13 +1063,13 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         expInfo['extend'] = 0
                     else:
                         if attrs['dir'] == '1' and attrs['se'] == 0:
-                            if attrs['indexes'][1] > 0 and bpaths[attrs['indexes'][0]][attrs['indexes'][1]-1].pos.x == 0:
+                            if attrs['indexes'][1] > 0 and skeletonPath(attrs['indexes'][0])[attrs['indexes'][1]-1].pos.x == 0:
                                 continue
                             serif = False
                         elif attrs['dir'] == '1' and attrs['se'] == 1:
                             other = True
                         else:
-                            raise 'undefine'
+                            raise undefined()
                 i = 0
                 while i < len(expInfo['back']):
                     attrs = expInfo['back'][i]
@@ -531,12 +1090,12 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     expandLen = expInfo.get('extend', 9999)
                     if other:
                         if expandLen < STROKE['length']:
-                            raise 'undefine'
+                            raise undefined()
                         expandLen = STROKE['length']
-                    elif expandLen > STROKE_WIDTH * 3/2:
-                        expandLen = STROKE_WIDTH / 2
-                    elif expandLen > STROKE_WIDTH / 2:
-                        expandLen = STROKE_WIDTH / 4
+                    elif expandLen > strokeWidth * 3/2:
+                        expandLen = strokeWidth / 2
+                    elif expandLen > strokeWidth / 2:
+                        expandLen = strokeWidth / 4
                     else:
                         expandLen = 0
                     pathLen += expandLen
@@ -544,29 +1103,29 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     areaLen = abs(ctrl.pos.x) / 2
                     areaLen += expandLen
                     
-                    parallelPath[0].start(prePos - bs.Point(expandLen, STROKE_WIDTH / 2))
+                    parallelPath[0].start(prePos - bs.Point(expandLen, strokeWidth / 2))
                     parallelPath[0].connect(bs.Point(pathLen, 0))
                     
-                    parallelPath[1].start(prePos - bs.Point(expandLen, STROKE_WIDTH / 2))
+                    parallelPath[1].start(prePos - bs.Point(expandLen, strokeWidth / 2))
 
                     if areaLen < STROKE['length']:
-                        parallelPath[1].connect(bs.Point(areaLen, STROKE_WIDTH))
+                        parallelPath[1].connect(bs.Point(areaLen, strokeWidth))
                         parallelPath[1].connect(bs.Point(pathLen - areaLen, 0))
                     else:
                         parallelPath[1].connect(bs.Point(0, STROKE['v'][0]))
-                        parallelPath[1].connect(bs.Point(STROKE['length'], STROKE_WIDTH - STROKE['v'][0]))
+                        parallelPath[1].connect(bs.Point(STROKE['length'], strokeWidth - STROKE['v'][0]))
                         parallelPath[1].connect(bs.Point(pathLen - STROKE['length'], 0))
                 else:
-                    parallelPath[0].start(prePos - bs.Point(0, STROKE_WIDTH / 2))
+                    parallelPath[0].start(prePos - bs.Point(0, strokeWidth / 2))
                     parallelPath[0].connect(bs.Point(pathLen, 0))
-                    parallelPath[1].start(prePos - bs.Point(0, STROKE_WIDTH / 2))
-                    parallelPath[1].connect(bs.Point(0, STROKE_WIDTH))
+                    parallelPath[1].start(prePos - bs.Point(0, strokeWidth / 2))
+                    parallelPath[1].connect(bs.Point(0, strokeWidth))
                     parallelPath[1].connect(bs.Point(pathLen, 0))
             elif preDir == '2' or preDir == '1':
-                    parallelPath[0].connect(currPos - parallelPath[0].endPos() + bs.Point(0, -STROKE_WIDTH/2))
-                    parallelPath[1].connect(currPos - parallelPath[1].endPos() + bs.Point(0, STROKE_WIDTH/2))
+                    parallelPath[0].connect(currPos - parallelPath[0].endPos() + bs.Point(0, -strokeWidth/2))
+                    parallelPath[1].connect(currPos - parallelPath[1].endPos() + bs.Point(0, strokeWidth/2))
             else:
-                raise 'undefine'
+                raise undefined()
             
             if nectDir == '*':
                 expInfo = extendedInfo(currPos, ctrl.pos, index)
@@ -589,21 +1148,21 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                                     break
                             if inOther: continue
 
-                            collPath = bpaths[attrs['indexes'][0]]
-                            if len(bpaths[attrs['indexes'][0]]) > 1:
+                            collPath = skeletonPath(attrs['indexes'][0])
+                            if len(skeletonPath(attrs['indexes'][0])) > 1:
                                 pass
                             else:
                                 corrs = [0, 0]
-                                collPath = bpaths[attrs['indexes'][0]]
+                                collPath = skeletonPath(attrs['indexes'][0])
                                 tempCtrl = collPath[attrs['indexes'][1]-1].pos
-                                collCtrl = strokeCtrl(tempCtrl, None, None, unit)
+                                collCtrl = curveCtrl(tempCtrl, None, None)
                                 collCtrlPos = collPath.posIn(attrs['indexes'][1])
 
                                 [collT, t] = collCtrl.intersections(collCtrlPos, ctrl, prePos)
                                 if len(t):
                                     tempTangent = collCtrl.tangents(collT[0], pos=collCtrlPos)
-                                    corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(0, STROKE_WIDTH/2), currPos - bs.Point(0, STROKE_WIDTH/2,)).x - currPos.x
-                                    corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(0, STROKE_WIDTH/2), currPos + bs.Point(0, STROKE_WIDTH/2,)).x - currPos.x
+                                    corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(0, strokeWidth/2), currPos - bs.Point(0, strokeWidth/2,)).x - currPos.x
+                                    corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(0, strokeWidth/2), currPos + bs.Point(0, strokeWidth/2,)).x - currPos.x
                                     
                                     parallelPath[0][-1].pos.x += corrs[0]
                                     parallelPath[1][-1].pos.x += corrs[1]
@@ -613,7 +1172,7 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                             expInfo['extend'] = 0
                     elif attrs['dir'] == '2':
                         if len(expInfo['back']) != 1:
-                            raise 'undefine'
+                            raise undefined()
                         serif = False
                     else:
                         other = True
@@ -622,12 +1181,12 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     expandLen = expInfo.get('extend', 9999)
                     if other:
                         if expandLen < STROKE['end']['length']:
-                            raise 'undefine'
+                            raise undefined()
                         expandLen = STROKE['end']['length']
-                    elif expandLen > STROKE_WIDTH * 3/2:
-                        expandLen = STROKE_WIDTH / 2
-                    elif expandLen > STROKE_WIDTH / 2:
-                        expandLen = STROKE_WIDTH / 4
+                    elif expandLen > strokeWidth * 3/2:
+                        expandLen = strokeWidth / 2
+                    elif expandLen > strokeWidth / 2:
+                        expandLen = strokeWidth / 4
                     else:
                         expandLen = 0
 
@@ -639,7 +1198,7 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     
                     parallelPath[0][-1].pos.x += expandLen - STROKE['end']['length'] * ratio
                     parallelPath[0].connect(bs.Point(STROKE['end']['h'][0] * ratio, -STROKE['end']['v'][0]))
-                    parallelPath[0].connect(bs.Point((STROKE['end']['length'] - STROKE['end']['h'][0]) * ratio, STROKE_WIDTH + STROKE['end']['v'][0] - STROKE['end']['v'][1]))
+                    parallelPath[0].connect(bs.Point((STROKE['end']['length'] - STROKE['end']['h'][0]) * ratio, strokeWidth + STROKE['end']['v'][0] - STROKE['end']['v'][1]))
                     parallelPath[0].connect(bs.Point(0, STROKE['end']['v'][1]))
                     parallelPath[1][-1].pos.x += expandLen
                 else:
@@ -663,7 +1222,7 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         elif not attrs['padding'] and attrs['dir'] == '1' and attrs['se'] == 0:
                             pass # nothing
                         else:
-                            raise 'undefine'
+                            raise undefined()
 
                 expandLen = STROKE['end_2']['h'][1]
                 
@@ -674,39 +1233,19 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     ratio = areaLen / STROKE['end_2']['length']
                 
                 if serif:
-                    parallelPath[0][-1].pos.x += STROKE_WIDTH/2 - (STROKE['end_2']['length'] - STROKE['end_2']['h'][1]) * ratio
+                    parallelPath[0][-1].pos.x += strokeWidth/2 - (STROKE['end_2']['length'] - STROKE['end_2']['h'][1]) * ratio
                     parallelPath[0].connect(bs.Point(STROKE['end_2']['h'][0] * ratio, -STROKE['end_2']['v'][0] * ratio))
                     parallelPath[0].connect(bs.Point((STROKE['end_2']['length'] - STROKE['end_2']['h'][0]) * ratio, STROKE['end_2']['v'][1]))
                     parallelPath[0].connect(bs.Point(-STROKE['end_2']['h'][1] * ratio, STROKE['end_2']['v'][2]))
-                    parallelPath[1][-1].pos.x -= STROKE_WIDTH / 2
+                    parallelPath[1][-1].pos.x -= strokeWidth / 2
                 else:
-                    parallelPath[0][-1].pos.x += STROKE_WIDTH/2
-                    parallelPath[0].connect(bs.Point(0, STROKE_WIDTH))
-                    parallelPath[1][-1].pos.x -= STROKE_WIDTH / 2
+                    parallelPath[0][-1].pos.x += strokeWidth/2
+                    parallelPath[0].connect(bs.Point(0, strokeWidth))
+                    parallelPath[1][-1].pos.x -= strokeWidth / 2
             else:
-                raise Exception('Undefine stroke dir!')
+                raise undefined('undefined stroke direction')
         elif dir == '2':
-            STROKE = {
-                'length': 64,
-                'h': [
-                    16,
-                    8,
-                    8
-                ],
-                'v': [
-                    12,
-                    12
-                ],
-                'end': {
-                    'length': 48,
-                    'h': [
-                        24,
-                    ],
-                    'v': [
-                        12
-                    ],
-                }
-            }
+            STROKE = styles['2']
 
             pathLen = ctrl.pos.y
             if preDir == '*':
@@ -728,21 +1267,21 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                                 break
                         if inOther: continue
 
-                        collPath = bpaths[attrs['indexes'][0]]
-                        if len(bpaths[attrs['indexes'][0]]) > 1 and collPath[attrs['indexes'][1]].pos.y > 0:
+                        collPath = skeletonPath(attrs['indexes'][0])
+                        if len(skeletonPath(attrs['indexes'][0])) > 1 and collPath[attrs['indexes'][1]].pos.y > 0:
                             if attrs['indexes'][1] > 0:
                                 tempCtrl = collPath[attrs['indexes'][1]-1].pos
                                 if direction(tempCtrl) == '2':
-                                    collCtrl, corr = strokeCtrl(collPath[attrs['indexes'][1]].pos, tempCtrl, None, unit)
+                                    collCtrl, corr = curveCtrl(collPath[attrs['indexes'][1]].pos, tempCtrl, None)
                                     collCtrlPos = collPath.posIn(attrs['indexes'][1])
                                     collCtrlPos.y -= corr
                                 else:
-                                    collCtrl = strokeCtrl(collPath[attrs['indexes'][1]].pos, None, None, unit)
+                                    collCtrl = curveCtrl(collPath[attrs['indexes'][1]].pos, None, None)
                                     collCtrlPos = collPath.posIn(attrs['indexes'][1])
                             else:
-                                raise 'undefine'
+                                raise undefined()
                         else:
-                            collCtrl = strokeCtrl(collPath[attrs['indexes'][1]].pos, None, None, unit)
+                            collCtrl = curveCtrl(collPath[attrs['indexes'][1]].pos, None, None)
                             collCtrlPos = collPath.posIn(attrs['indexes'][1])
 
                         [collT, t] = collCtrl.intersections(collCtrlPos, ctrl, prePos)
@@ -754,8 +1293,8 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                             serif = False
                             
                             tempTangent = collCtrl.tangents(collT[0], pos=collCtrlPos)
-                            corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(STROKE_WIDTH/2, 0), currPos + bs.Point(STROKE_WIDTH/2, 0)).y - prePos.y
-                            corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(STROKE_WIDTH/2, 0), currPos - bs.Point(STROKE_WIDTH/2, 0)).y - prePos.y
+                            corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(strokeWidth/2, 0), currPos + bs.Point(strokeWidth/2, 0)).y - prePos.y
+                            corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(strokeWidth/2, 0), currPos - bs.Point(strokeWidth/2, 0)).y - prePos.y
                         
                         expInfo['extend'] = 0
                 for attrs in expInfo['back']:
@@ -767,18 +1306,19 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                 
                 if serif:
                     expandLen = expInfo.get('extend', 9999)
+                    headLength = STROKE['length']
                     if other:
-                        expandTest = STROKE['length'] - STROKE_WIDTH/2
-                        if expandLen < STROKE_WIDTH:
-                            raise 'undefine'
+                        expandTest = headLength - strokeWidth/2
+                        if expandLen < strokeWidth:
+                            raise undefined()
                         elif expandLen < expandTest:
-                            STROKE['length'] = expandLen
+                            headLength = expandLen
                         else:
                             expandLen = expandTest
-                    elif expandLen > STROKE_WIDTH * 3/2:
-                        expandLen = STROKE_WIDTH / 2
-                    elif expandLen > STROKE_WIDTH / 2:
-                        expandLen = STROKE_WIDTH / 4
+                    elif expandLen > strokeWidth * 3/2:
+                        expandLen = strokeWidth / 2
+                    elif expandLen > strokeWidth / 2:
+                        expandLen = strokeWidth / 4
                     else:
                         expandLen = 0
                     pathLen += expandLen
@@ -786,35 +1326,35 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     areaLen = abs(ctrl.pos.y) / 3 * 2
                     areaLen += expandLen
                     
-                    if areaLen < STROKE['length']:
-                        parallelPath[0].start(prePos - bs.Point(STROKE_WIDTH/2 + STROKE['h'][0], expandLen))
-                        parallelPath[0].connect(bs.Point(STROKE['h'][0] + STROKE_WIDTH + STROKE['h'][2], areaLen - STROKE['v'][1]))
+                    if areaLen < headLength:
+                        parallelPath[0].start(prePos - bs.Point(strokeWidth/2 + STROKE['h'][0], expandLen))
+                        parallelPath[0].connect(bs.Point(STROKE['h'][0] + strokeWidth + STROKE['h'][2], areaLen - STROKE['v'][1]))
                         parallelPath[0].connect(bs.Point(-STROKE['h'][2], STROKE['v'][1]))
                         parallelPath[0].connect(bs.Point(0, pathLen - areaLen))
-                        parallelPath[1].start(prePos - bs.Point(STROKE_WIDTH/2 + STROKE['h'][0], expandLen))
+                        parallelPath[1].start(prePos - bs.Point(strokeWidth/2 + STROKE['h'][0], expandLen))
                         parallelPath[1].connect(bs.Point(STROKE['h'][0], areaLen))
                         parallelPath[1].connect(bs.Point(0, pathLen - areaLen))
                     else:
-                        parallelPath[0].start(prePos - bs.Point(STROKE_WIDTH/2 + STROKE['h'][0] - STROKE['h'][1], expandLen))
-                        parallelPath[0].connect(bs.Point(STROKE['h'][0] - STROKE['h'][1] + STROKE_WIDTH + STROKE['h'][2], STROKE['length'] - STROKE['v'][1]))
+                        parallelPath[0].start(prePos - bs.Point(strokeWidth/2 + STROKE['h'][0] - STROKE['h'][1], expandLen))
+                        parallelPath[0].connect(bs.Point(STROKE['h'][0] - STROKE['h'][1] + strokeWidth + STROKE['h'][2], headLength - STROKE['v'][1]))
                         parallelPath[0].connect(bs.Point(-STROKE['h'][2], STROKE['v'][1]))
-                        parallelPath[0].connect(bs.Point(0, pathLen - STROKE['length']))
+                        parallelPath[0].connect(bs.Point(0, pathLen - headLength))
 
-                        parallelPath[1].start(prePos - bs.Point(STROKE_WIDTH/2 + STROKE['h'][0] - STROKE['h'][1], expandLen))
+                        parallelPath[1].start(prePos - bs.Point(strokeWidth/2 + STROKE['h'][0] - STROKE['h'][1], expandLen))
                         parallelPath[1].connect(bs.Point(-STROKE['h'][1], STROKE['v'][0]))
-                        parallelPath[1].connect(bs.Point(STROKE['h'][0], STROKE['length'] - STROKE['v'][0]))
-                        parallelPath[1].connect(bs.Point(0, pathLen - STROKE['length']))
+                        parallelPath[1].connect(bs.Point(STROKE['h'][0], headLength - STROKE['v'][0]))
+                        parallelPath[1].connect(bs.Point(0, pathLen - headLength))
                 else:
-                    parallelPath[0].start(prePos - bs.Point(STROKE_WIDTH/2, -corrs[1]))
-                    parallelPath[0].connect(bs.Point(STROKE_WIDTH, corrs[0]-corrs[1]))
+                    parallelPath[0].start(prePos - bs.Point(strokeWidth/2, -corrs[1]))
+                    parallelPath[0].connect(bs.Point(strokeWidth, corrs[0]-corrs[1]))
                     parallelPath[0].connect(bs.Point(0, pathLen+corrs[1]))
-                    parallelPath[1].start(prePos - bs.Point(STROKE_WIDTH/2, -corrs[1]))
+                    parallelPath[1].start(prePos - bs.Point(strokeWidth/2, -corrs[1]))
                     parallelPath[1].connect(bs.Point(0, pathLen+corrs[0]))
             elif preDir == '6' or preDir == '9' or preDir == '3' or preDir == '1':
                 parallelPath[0].connect(bs.Point(0, currPos.y - parallelPath[0].endPos().y))
                 parallelPath[1].connect(bs.Point(0, currPos.y - parallelPath[1].endPos().y))
             else:
-                raise 'undefine'
+                raise undefined()
             if nectDir == '*':
                 expInfo = extendedInfo(currPos, ctrl.pos, index)
                 serif = True
@@ -822,16 +1362,16 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                 corrs = [0, 0]
                 for attrs in expInfo['front']:
                     if attrs['symbol'] == 'h' and attrs['indexes'][1] > 0:
-                        collPath = bpaths[attrs['indexes'][0]]
+                        collPath = skeletonPath(attrs['indexes'][0])
                         tempCtrl = collPath[attrs['indexes'][1]-1].pos
                         if direction(tempCtrl) == '3':
-                            collCtrl = strokeCtrl(tempCtrl, None, collPath[attrs['indexes'][1]].pos, unit)
+                            collCtrl = curveCtrl(tempCtrl, None, collPath[attrs['indexes'][1]].pos)
                             collCtrlPos = collPath.posIn(attrs['indexes'][1]-1)
 
                             [collT, t] = collCtrl.intersections(collCtrlPos, ctrl, prePos)
                             tempTangent = collCtrl.tangents(collT[0], pos=collCtrlPos)
-                            corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(STROKE_WIDTH/2, 0), currPos + bs.Point(STROKE_WIDTH/2, 0)).y - currPos.y
-                            corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(STROKE_WIDTH/2, 0), currPos - bs.Point(STROKE_WIDTH/2, 0)).y - currPos.y
+                            corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(strokeWidth/2, 0), currPos + bs.Point(strokeWidth/2, 0)).y - currPos.y
+                            corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(strokeWidth/2, 0), currPos - bs.Point(strokeWidth/2, 0)).y - currPos.y
                             
                             parallelPath[0][-1].pos.y += corrs[0]
                             parallelPath[1][-1].pos.y += corrs[1]
@@ -845,16 +1385,16 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                             serif = False
                 for attrs in expInfo['back']:
                     if attrs['symbol'] == 'h' and attrs['indexes'][1] > 0:
-                        collPath = bpaths[attrs['indexes'][0]]
+                        collPath = skeletonPath(attrs['indexes'][0])
                         tempCtrl = collPath[attrs['indexes'][1]-1].pos
                         if direction(tempCtrl) == '3':
-                            collCtrl = strokeCtrl(tempCtrl, None, collPath[attrs['indexes'][1]].pos, unit)
+                            collCtrl = curveCtrl(tempCtrl, None, collPath[attrs['indexes'][1]].pos)
                             collCtrlPos = collPath.posIn(attrs['indexes'][1]-1)
 
                             [collT, t] = collCtrl.intersections(collCtrlPos, ctrl, prePos)
                             tempTangent = collCtrl.tangents(collT[0], pos=collCtrlPos)
-                            corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(STROKE_WIDTH/2, 0), currPos + bs.Point(STROKE_WIDTH/2, 0)).y - currPos.y
-                            corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(STROKE_WIDTH/2, 0), currPos - bs.Point(STROKE_WIDTH/2, 0)).y - currPos.y
+                            corrs[0] = bs.intersection(tempTangent[0], tempTangent[1], prePos + bs.Point(strokeWidth/2, 0), currPos + bs.Point(strokeWidth/2, 0)).y - currPos.y
+                            corrs[1] = bs.intersection(tempTangent[0], tempTangent[1], prePos - bs.Point(strokeWidth/2, 0), currPos - bs.Point(strokeWidth/2, 0)).y - currPos.y
                             
                             parallelPath[0][-1].pos.y += corrs[0]
                             parallelPath[1][-1].pos.y += corrs[1]
@@ -869,32 +1409,33 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         
                 if serif:
                     expandLen = expInfo.get('extend', 9999)
+                    endLength = STROKE['end']['length']
                     if other:
-                        expandTest = STROKE['end']['length']
-                        if expandLen < STROKE_WIDTH:
-                            raise 'undefine'
+                        expandTest = endLength
+                        if expandLen < strokeWidth:
+                            raise undefined()
                         elif expandLen < expandTest:
-                            STROKE['end']['length'] = expandLen
+                            endLength = expandLen
                         else:
                             expandLen = expandTest
-                    elif expandLen > STROKE_WIDTH * 3/2:
-                        expandLen = STROKE_WIDTH / 2
-                    elif expandLen > STROKE_WIDTH / 2:
-                        expandLen = STROKE_WIDTH / 4
+                    elif expandLen > strokeWidth * 3/2:
+                        expandLen = strokeWidth / 2
+                    elif expandLen > strokeWidth / 2:
+                        expandLen = strokeWidth / 4
                     else:
                         expandLen = 0
 
                     areaLen = abs(ctrl.pos.y) / 3
                     areaLen += expandLen
                     ratio = 1
-                    if areaLen < STROKE['end']['length']:
-                        ratio = areaLen / STROKE['end']['length']
+                    if areaLen < endLength:
+                        ratio = areaLen / endLength
                     
                     parallelPath[0][-1].pos.y += expandLen - STROKE['end']['v'][0]
-                    parallelPath[0].connect(bs.Point(-STROKE_WIDTH + STROKE['end']['h'][0], STROKE['end']['v'][0]))
+                    parallelPath[0].connect(bs.Point(-strokeWidth + STROKE['end']['h'][0], STROKE['end']['v'][0]))
 
-                    parallelPath[1][-1].pos.y += expandLen - STROKE['end']['length'] * ratio
-                    parallelPath[1].connect(bs.Point((STROKE['end']['h'][0]), STROKE['end']['length'] * ratio))
+                    parallelPath[1][-1].pos.y += expandLen - endLength * ratio
+                    parallelPath[1].connect(bs.Point((STROKE['end']['h'][0]), endLength * ratio))
                 else:
                     parallelPath[0].connect(parallelPath[1].endPos() - parallelPath[0].endPos())
                 
@@ -905,89 +1446,47 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                 expInfo = extendedInfo(currPos, ctrl.pos, index)
                 for attrs in expInfo['front'] + expInfo['back']:
                     if attrs['indexes'][0] != npath or (attrs['indexes'][1] != index and attrs['indexes'][1] != index + 1):
-                        raise 'undefine'
+                        raise undefined()
 
                 if re.fullmatch(r'[^26]*268\*', dirAttrs[index:]):
-                    STROKE = [
-                        {
-                            'h':[
-                                28,
-                                4
-                            ],
-                            'v':[
-                                30,
-                                24,
-                                10
-                            ]
-                        },
-                        {
-                            'h':[
-                                6,
-                                42,
-                                12
-                            ],
-                            'v':[
-                                10
-                            ]
-                        },
-                    ]
-
-                    if parallelPath[0][-1].pos.y < STROKE_WIDTH/2 + STROKE[0]['v'][0]:
-                        raise 'undefine'
+                    STROKE = styles['26']
+
+                    if parallelPath[0][-1].pos.y < strokeWidth/2 + STROKE[0]['v'][0]:
+                        raise undefined()
 
                     index += 1
                     ctrl = bpath[index]
                     pathLen = ctrl.pos.x
-                    parallelPath[0][-1].pos.y -= STROKE_WIDTH/2 + STROKE[0]['v'][0]
-                    parallelPath[0].connect(bs.Point(pathLen/2-STROKE_WIDTH/2, STROKE[0]['v'][0]), bs.Point(0, STROKE[0]['v'][1]), bs.Point(STROKE[0]['h'][0], STROKE[0]['v'][0]))
-                    parallelPath[1][-1].pos.y -= STROKE_WIDTH/2 + STROKE[0]['v'][0]
-                    parallelPath[1].connect(bs.Point(pathLen/2+STROKE_WIDTH/2, STROKE[0]['v'][0]+STROKE_WIDTH), bs.Point(0, STROKE[0]['v'][0] + STROKE[0]['v'][2]), bs.Point(STROKE[0]['h'][1], STROKE[0]['v'][0]+STROKE_WIDTH))
+                    parallelPath[0][-1].pos.y -= strokeWidth/2 + STROKE[0]['v'][0]
+                    parallelPath[0].connect(bs.Point(pathLen/2-strokeWidth/2, STROKE[0]['v'][0]), bs.Point(0, STROKE[0]['v'][1]), bs.Point(STROKE[0]['h'][0], STROKE[0]['v'][0]))
+                    parallelPath[1][-1].pos.y -= strokeWidth/2 + STROKE[0]['v'][0]
+                    parallelPath[1].connect(bs.Point(pathLen/2+strokeWidth/2, STROKE[0]['v'][0]+strokeWidth), bs.Point(0, STROKE[0]['v'][0] + STROKE[0]['v'][2]), bs.Point(STROKE[0]['h'][1], STROKE[0]['v'][0]+strokeWidth))
 
                     index += 1
                     ctrl = bpath[index]
                     expInfo = extendedInfo(currPos, ctrl.pos, index).get('extend', 9999) / 2 - ctrl.pos.y
                     pathLen = [pathLen/2, min(expInfo, unit.y)]
-                    parallelPath[0].connect(bs.Point(pathLen[0], -pathLen[1] + STROKE_WIDTH/2), bs.Point(pathLen[0] - STROKE_WIDTH/2, 0), bs.Point(pathLen[0] - STROKE[1]['h'][0], -STROKE[1]['v'][0]))
-                    parallelPath[1].connect(bs.Point(pathLen[0], -STROKE_WIDTH/2), bs.Point(STROKE[1]['h'][1], 0), bs.Point(pathLen[0] - STROKE[1]['h'][2], 0))
-                    parallelPath[1].connect(bs.Point(STROKE_WIDTH/4, -pathLen[1]), bs.Point(STROKE_WIDTH/2, -STROKE_WIDTH**2/4 / STROKE[1]['h'][2]))
+                    parallelPath[0].connect(bs.Point(pathLen[0], -pathLen[1] + strokeWidth/2), bs.Point(pathLen[0] - strokeWidth/2, 0), bs.Point(pathLen[0] - STROKE[1]['h'][0], -STROKE[1]['v'][0]))
+                    parallelPath[1].connect(bs.Point(pathLen[0], -strokeWidth/2), bs.Point(STROKE[1]['h'][1], 0), bs.Point(pathLen[0] - STROKE[1]['h'][2], 0))
+                    parallelPath[1].connect(bs.Point(strokeWidth/4, -pathLen[1]), bs.Point(strokeWidth/2, -strokeWidth**2/4 / STROKE[1]['h'][2]))
 
                     parallelPath[0].connect(parallelPath[1].endPos() - parallelPath[0].endPos())
                     parallelPath[0].connectPath(parallelPath[1].reverse())
                     parallelPath[0].close()
                     pathList.append(parallelPath[0])
                 else:
-                    parallelPath[0][-1].pos.y -= STROKE_WIDTH/2
-                    parallelPath[1][-1].pos.y -= STROKE_WIDTH/4*3
-                    parallelPath[1].connect(bs.Point(-STROKE_WIDTH/3 * 2, STROKE_WIDTH/2))
-                    parallelPath[1].connect(bs.Point(STROKE_WIDTH/3 * 2, STROKE_WIDTH))
-                    parallelPath[1].connect(bs.Point(STROKE_WIDTH/2, -STROKE_WIDTH/4))
-                    # parallelPath[1].connect(currPos + bs.Point(STROKE_WIDTH/2, STROKE_WIDTH/2) - parallelPath[1].endPos())
+                    parallelPath[0][-1].pos.y -= strokeWidth/2
+                    parallelPath[1][-1].pos.y -= strokeWidth/4*3
+                    parallelPath[1].connect(bs.Point(-strokeWidth/3 * 2, strokeWidth/2))
+                    parallelPath[1].connect(bs.Point(strokeWidth/3 * 2, strokeWidth))
+                    parallelPath[1].connect(bs.Point(strokeWidth/2, -strokeWidth/4))
+                    # parallelPath[1].connect(currPos + bs.Point(strokeWidth/2, strokeWidth/2) - parallelPath[1].endPos())
             elif nectDir == '3' or nectDir == '1' or nectDir == '4' or nectDir == '9':
                 pass # Nothing
             else:
-                raise Exception('Undefine stroke dir!')
+                raise undefined('undefined stroke direction')
         elif dir == '1':
-            STROKE = {
-                'length': 42,
-                'h': [
-                    18
-                ],
-                'v': [
-                    24,
-                    32
-                ],
-                'end': {
-                    'h': [
-                        20,
-                        16,
-                        8
-                    ],
-                    'v': [
-                        6,
-                        28
-                    ]
-                }
-            }
+            STROKE = styles['1']
 
             indexCorr = 0
             if nectDir == '1':
@@ -1017,17 +1516,17 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                                 attach['h'] = 'h'
                                 attach['v'] = 'v'
                             else:
-                                raise 'undefine'
+                                raise undefined()
                         else:
                             serif = False
                             attach['h'] = 'h'
                     elif attrs['symbol'] == 'v':
                         serif = False
                         if tempCheck[0] == attrs['indexes'][0] and tempCheck[1]+1 == attrs['indexes'][1]:
-                            tempPath = bpaths[tempCheck[0]]
+                            tempPath = skeletonPath(tempCheck[0])
                             attach['d'] = bs.BezierPath()
                             attach['d'].start(tempPath.posIn(tempCheck[1]))
-                            attach['d'].append(strokeCtrl(tempPath[tempCheck[1]].pos, None, tempPath[tempCheck[1]+1].pos, unit))
+                            attach['d'].append(curveCtrl(tempPath[tempCheck[1]].pos, None, tempPath[tempCheck[1]+1].pos))
                         else:
                             # if not attrs['padding']:
                             #     raise 'undefine'
@@ -1040,8 +1539,8 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                 for attrs in expInfo['back']:
                     if attrs['symbol'] == 'h':
                         if not attrs['padding']:
-                            prePos.y -= STROKE_WIDTH/2
-                            ctrl.pos.y += STROKE_WIDTH/2
+                            prePos.y -= strokeWidth/2
+                            ctrl.pos.y += strokeWidth/2
                         else:
                             serif = False
                             attach['h'] = 'h'
@@ -1053,29 +1552,29 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     else:
                         if not attrs['padding']:
                             if attrs['dir'] == '3' and attrs['se'] == 0:
-                                tempPath = bpaths[attrs['indexes'][0]]
+                                tempPath = skeletonPath(attrs['indexes'][0])
                                 if attrs['indexes'][1] > 0 and abs(tempPath[attrs['indexes'][1]-1].pos.x) < 0.0001:
                                     attach['d'] = bs.BezierPath()
                                     serif = False
-                                    tempCtrlm, corr = strokeCtrl(tempPath[attrs['indexes'][1]].pos, tempPath[attrs['indexes'][1]-1].pos, None, unit)
+                                    tempCtrlm, corr = curveCtrl(tempPath[attrs['indexes'][1]].pos, tempPath[attrs['indexes'][1]-1].pos, None)
                                     attach['d'].start(tempPath.posIn(attrs['indexes'][1]) - bs.Point(0, corr))
                                     attach['d'].append(tempCtrlm)
                                     del attach['v']
 
-                                    tempDir = ctrl.pos.normalization() * STROKE_WIDTH*1.5
+                                    tempDir = ctrl.pos.normalization() * strokeWidth*1.5
                                     prePos -= tempDir
                                     ctrl.pos += tempDir
                             else:
-                                raise 'undefine'
+                                raise undefined()
                 
                 comp = bs.BezierPath()
                 comp.start(bs.Point(0, 0))
-                sCtrl = strokeCtrl(ctrl.pos, None, None, unit)
+                sCtrl = curveCtrl(ctrl.pos, None, None)
                 if serif:
-                    comp.connect(bs.Point(STROKE_WIDTH * 2, STROKE['v'][0] * ratio))
+                    comp.connect(bs.Point(strokeWidth * 2, STROKE['v'][0] * ratio))
                     comp.connect(bs.Point(0, pathLen - STROKE['v'][0] * ratio))
-                    comp.connect(bs.Point(STROKE_WIDTH / -2, 0))
-                    comp.connect(bs.Point(STROKE_WIDTH * -1.5 + STROKE['h'][0], STROKE['length'] * ratio - pathLen))
+                    comp.connect(bs.Point(strokeWidth / -2, 0))
+                    comp.connect(bs.Point(strokeWidth * -1.5 + STROKE['h'][0], STROKE['length'] * ratio - pathLen))
                     comp.connect(bs.Point(-STROKE['h'][0], -STROKE['v'][1] * ratio))
                     comp.close()
 
@@ -1089,15 +1588,15 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     elif nectDir == '6':
                         parallelPath[0].start(comp.startPos())
                         parallelPath[0].extend(comp[:2])
-                        parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[0].posIn(1), interval=[0,1])[0])[0]
+                        parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[0].posIn(1), interval=[0,1])[0])[0]
 
                         parallelPath[1].start(comp.startPos())
                         comp = comp.reverse()
                         parallelPath[1].extend(comp[:3])
-                        parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[1].posIn(2), interval=[0,1])[0])[0]
+                        parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[1].posIn(2), interval=[0,1])[0])[0]
                         parallelPath[1].connect(bs.Point(-STROKE['end']['h'][0], STROKE['end']['v'][0]))
                         parallelPath[1].connect(bs.Point(STROKE['end']['h'][1], STROKE['end']['v'][1]))
-                        parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], STROKE_WIDTH - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
+                        parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], strokeWidth - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
                     elif nectDir == '3':
                         parallelPath[0].start(comp.startPos())
                         parallelPath[0].extend(comp[:2])
@@ -1105,16 +1604,16 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         comp = comp.reverse()
                         parallelPath[1].extend(comp[:3])
                     else:
-                        raise 'undefine'
+                        raise undefined()
                 else:
-                    comp.connect(bs.Point(STROKE_WIDTH/2 * 3, 0))
+                    comp.connect(bs.Point(strokeWidth/2 * 3, 0))
                     comp.connect(bs.Point(0, pathLen))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, 0))
-                    comp.connect(bs.Point(-STROKE_WIDTH, -pathLen))
+                    comp.connect(bs.Point(-strokeWidth/2, 0))
+                    comp.connect(bs.Point(-strokeWidth, -pathLen))
                     comp.close()
                     
-                    corrVec = ctrl.pos.normalization() * STROKE_WIDTH
-                    sCtrl = strokeCtrl(ctrl.pos + corrVec, None, None, unit)
+                    corrVec = ctrl.pos.normalization() * strokeWidth
+                    sCtrl = curveCtrl(ctrl.pos + corrVec, None, None)
                     comp = bs.controlComp(sCtrl, comp, prePos - corrVec, 2/3)
                     tempCtrls = []
                     tempPos = []
@@ -1177,59 +1676,59 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     elif nectDir == '6':
                         parallelPath[0].start(comp.startPos())
                         parallelPath[0].extend(comp[:tempIndex+1])
-                        parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[0].posIn(tempIndex), interval=[0,1])[0])[0]
+                        parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[0].posIn(tempIndex), interval=[0,1])[0])[0]
 
                         parallelPath[1].start(comp.startPos())
                         comp = comp.reverse()
                         parallelPath[1].append(comp[0])
-                        parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[1].posIn(0), interval=[0,1])[0])[0]
+                        parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[1].posIn(0), interval=[0,1])[0])[0]
                         parallelPath[1].connect(bs.Point(-STROKE['end']['h'][0], STROKE['end']['v'][0]))
                         parallelPath[1].connect(bs.Point(STROKE['end']['h'][1], STROKE['end']['v'][1]))
-                        parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], STROKE_WIDTH - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
+                        parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], strokeWidth - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
                     else:
-                        raise 'undefine'
+                        raise undefined()
             elif nectDir == '*':
                 if preDir == '6':
                     if ctrl.pos.y < unit.y * 2.5 or -ctrl.pos.x < unit.x * 1.5:
                         parallelPath[0].connect(currPos - parallelPath[0].endPos())
-                        currNormal = ctrl.normals(1, -STROKE_WIDTH/2)[0]
+                        currNormal = ctrl.normals(1, -strokeWidth/2)[0]
                         parallelPath[0].connect(currNormal)
                         currRadian = -(-ctrl.pos).radian()
-                        parallelPath[1][-1].pos.x += STROKE_WIDTH/2 - STROKE_WIDTH/2/math.tan(currRadian) - STROKE_WIDTH/2/math.sin(currRadian)
+                        parallelPath[1][-1].pos.x += strokeWidth/2 - strokeWidth/2/math.tan(currRadian) - strokeWidth/2/math.sin(currRadian)
                         parallelPath[1].connect(currPos + currNormal - parallelPath[1].endPos())
                     else:
                         comp = bs.BezierPath()
                         comp.start(bs.Point(0, 0))
                         comp.connect(bs.Point(0, pathLen))
-                        comp.connect(bs.Point(-STROKE_WIDTH/2, 0))
-                        comp.connect(bs.Point(-STROKE_WIDTH, -pathLen))
+                        comp.connect(bs.Point(-strokeWidth/2, 0))
+                        comp.connect(bs.Point(-strokeWidth, -pathLen))
                         
-                        sCtrl = strokeCtrl(ctrl.pos, None, None, unit)
+                        sCtrl = curveCtrl(ctrl.pos, None, None)
                         comp = bs.controlComp(sCtrl, comp, prePos, 2/3)
 
-                        tempSplit = comp[0].splitting(comp[0].roots(y=prePos.y+STROKE_WIDTH/2, pos=comp.startPos())[0])
+                        tempSplit = comp[0].splitting(comp[0].roots(y=prePos.y+strokeWidth/2, pos=comp.startPos())[0])
                         tempPos1 = comp.startPos() + tempSplit[0].pos
                         parallelPath[0].append(tempSplit[1])
                         parallelPath[0].append(comp[1])
 
-                        tempSplit = comp[2].splitting(comp[2].roots(y=prePos.y+STROKE_WIDTH/2, pos=comp.posIn(2))[0])
+                        tempSplit = comp[2].splitting(comp[2].roots(y=prePos.y+strokeWidth/2, pos=comp.posIn(2))[0])
                         tempPos2 = comp.posIn(2) + tempSplit[0].pos
-                        parallelPath[1][-1].pos.x -= tempPos1.x - tempPos2.x - STROKE_WIDTH
+                        parallelPath[1][-1].pos.x -= tempPos1.x - tempPos2.x - strokeWidth
                         parallelPath[1].append(tempSplit[0].reverse())
                         
                     parallelPath[0].connectPath(parallelPath[1].reverse())
                     parallelPath[0].close()
                     pathList.append(parallelPath[0])
                 elif preDir == '2':
-                    sCtrl, corr = strokeCtrl(ctrl.pos, preCtrl.pos, None, unit)
+                    sCtrl, corr = curveCtrl(ctrl.pos, preCtrl.pos, None)
                     parallelPath[0][-1].pos.y -= corr
                     parallelPath[1][-1].pos.y -= corr
                     pathLen += corr
 
                     comp = bs.BezierPath()
                     comp.start(bs.Point(0, 0))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, pathLen), p2=bs.Point(0, pathLen/2))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, 0))
+                    comp.connect(bs.Point(-strokeWidth/2, pathLen), p2=bs.Point(0, pathLen/2))
+                    comp.connect(bs.Point(-strokeWidth/2, 0))
                     comp.connect(bs.Point(0, -pathLen))
 
                     comp = bs.controlComp(sCtrl, comp, prePos, 0.5)
@@ -1238,53 +1737,53 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     parallelPath[0].close()
                     pathList.append(parallelPath[0])
                 else:
-                    raise 'undefine'
+                    raise undefined()
             else:
                 if preDir == '6' and nectDir == '2':
                     comp = bs.BezierPath()
                     comp.start(bs.Point(0, 0))
                     comp.connect(bs.Point(0, pathLen))
-                    comp.connect(bs.Point(-STROKE_WIDTH, 0))
+                    comp.connect(bs.Point(-strokeWidth, 0))
                     comp.connect(bs.Point(0, -pathLen))
                     
-                    sCtrl = strokeCtrl(ctrl.pos, None, bpath[index+1].pos, unit)
+                    sCtrl = curveCtrl(ctrl.pos, None, bpath[index+1].pos)
                     comp = bs.controlComp(sCtrl, comp, prePos, 0.5)
 
-                    tempSplit = comp[0].splitting(comp[0].roots(y=prePos.y+STROKE_WIDTH/2, pos=comp.startPos())[0])
+                    tempSplit = comp[0].splitting(comp[0].roots(y=prePos.y+strokeWidth/2, pos=comp.startPos())[0])
                     tempPos1 = comp.startPos() + tempSplit[0].pos
                     parallelPath[0].append(tempSplit[1])
 
-                    tempSplit = comp[2].splitting(comp[2].roots(y=prePos.y+STROKE_WIDTH/2, pos=comp.posIn(2))[0])
+                    tempSplit = comp[2].splitting(comp[2].roots(y=prePos.y+strokeWidth/2, pos=comp.posIn(2))[0])
                     tempPos2 = comp.posIn(2) + tempSplit[0].pos
-                    parallelPath[1][-1].pos.x -= tempPos1.x - tempPos2.x - STROKE_WIDTH
+                    parallelPath[1][-1].pos.x -= tempPos1.x - tempPos2.x - strokeWidth
                     parallelPath[1].append(tempSplit[0].reverse())
                 elif preDir == '6' and nectDir == '6':
                     if ctrl.pos.y < unit.y * 2.5 or -ctrl.pos.x < unit.x * 1.5:
-                        currTangent = ctrl.pos.normalization() * STROKE_WIDTH/2
-                        currNormal = ctrl.normals(1, -STROKE_WIDTH/2)[0]
+                        currTangent = ctrl.pos.normalization() * strokeWidth/2
+                        currNormal = ctrl.normals(1, -strokeWidth/2)[0]
                         currRadian = -(-ctrl.pos).radian()
 
                         parallelPath[0].connect(currPos + currTangent - parallelPath[0].endPos())
-                        parallelPath[1][-1].pos.x += STROKE_WIDTH/2 - STROKE_WIDTH/2/math.tan(currRadian) - STROKE_WIDTH/2/math.sin(currRadian)
+                        parallelPath[1][-1].pos.x += strokeWidth/2 - strokeWidth/2/math.tan(currRadian) - strokeWidth/2/math.sin(currRadian)
                         parallelPath[1].connect(currPos + currTangent + currNormal - parallelPath[1].endPos())
                         
-                        parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[0].endPos()-parallelPath[0][-1].pos, interval=[0,1])[0])[0]
-                        parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[1].endPos()-parallelPath[1][-1].pos, interval=[0,1])[0])[0]
+                        parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[0].endPos()-parallelPath[0][-1].pos, interval=[0,1])[0])[0]
+                        parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[1].endPos()-parallelPath[1][-1].pos, interval=[0,1])[0])[0]
                         parallelPath[1].connect(bs.Point(-STROKE['end']['h'][0], STROKE['end']['v'][0]))
                         parallelPath[1].connect(bs.Point(STROKE['end']['h'][1], STROKE['end']['v'][1]))
-                        parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], STROKE_WIDTH - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
+                        parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], strokeWidth - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
                     else:
-                        raise 'undefine'
+                        raise undefined()
                 elif preDir == '2' and nectDir == '3':
-                    sCtrl, corr = strokeCtrl(ctrl.pos, preCtrl.pos, None, unit)
+                    sCtrl, corr = curveCtrl(ctrl.pos, preCtrl.pos, None)
                     parallelPath[0][-1].pos.y -= corr
                     parallelPath[1][-1].pos.y -= corr
                     pathLen += corr
 
                     comp = bs.BezierPath()
                     comp.start(bs.Point(0, 0))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, pathLen), p2=bs.Point(0, pathLen/2))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, 0))
+                    comp.connect(bs.Point(-strokeWidth/2, pathLen), p2=bs.Point(0, pathLen/2))
+                    comp.connect(bs.Point(-strokeWidth/2, 0))
                     comp.connect(bs.Point(0, -pathLen))
 
                     comp = bs.controlComp(sCtrl, comp, prePos, 0.5)
@@ -1292,48 +1791,46 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     parallelPath[1].append(comp[2].reverse())
                 elif preDir == '6' and nectDir == '3':
                     if ctrl.pos.y < unit.y * 2.5 or -ctrl.pos.x < unit.x * 1.5:
-                        currTangent = ctrl.pos.normalization() * STROKE_WIDTH/2
-                        currNormal = ctrl.normals(1, -STROKE_WIDTH/2)[0]
+                        currTangent = ctrl.pos.normalization() * strokeWidth/2
+                        currNormal = ctrl.normals(1, -strokeWidth/2)[0]
                         currRadian = -(-ctrl.pos).radian()
 
                         parallelPath[0].connect(currPos + currTangent - parallelPath[0].endPos())
-                        parallelPath[1][-1].pos.x += STROKE_WIDTH/2 - STROKE_WIDTH/2/math.tan(currRadian) - STROKE_WIDTH/2/math.sin(currRadian)
+                        parallelPath[1][-1].pos.x += strokeWidth/2 - strokeWidth/2/math.tan(currRadian) - strokeWidth/2/math.sin(currRadian)
                         parallelPath[1].connect(currPos + currTangent + currNormal - parallelPath[1].endPos())
                         
-                        # parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[0].endPos()-parallelPath[0][-1].pos, interval=[0,1])[0])[0]
-                        # parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-STROKE_WIDTH/2, pos=parallelPath[1].endPos()-parallelPath[1][-1].pos, interval=[0,1])[0])[0]
+                        # parallelPath[0][-1] = parallelPath[0][-1].splitting(parallelPath[0][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[0].endPos()-parallelPath[0][-1].pos, interval=[0,1])[0])[0]
+                        # parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=currPos.y-strokeWidth/2, pos=parallelPath[1].endPos()-parallelPath[1][-1].pos, interval=[0,1])[0])[0]
                         # parallelPath[1].connect(bs.Point(-STROKE['end']['h'][0], STROKE['end']['v'][0]))
                         # parallelPath[1].connect(bs.Point(STROKE['end']['h'][1], STROKE['end']['v'][1]))
-                        # parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], STROKE_WIDTH - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
+                        # parallelPath[1].connect(bs.Point(STROKE['end']['h'][2], strokeWidth - STROKE['end']['v'][1] - STROKE['end']['v'][0]))
                     else:
-                        raise 'undefine'
+                        raise undefined()
                 else:
-                    raise 'undefine'
+                    raise undefined()
         elif dir == '3':
             if re.fullmatch(r'36\*', dirAttrs[index:]):
-                STROKE = {
-                    'length': 54
-                }
+                STROKE = styles['36']
 
                 pathLen = ctrl.pos.distance() + bpath[index+1].pos.x
                 comp = bs.BezierPath()
                 comp.start(bs.Point(0, 0))
 
                 if preDir == '*':
-                    comp.connect(bs.Point(0, pathLen - STROKE_WIDTH/2))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, STROKE_WIDTH/2))
-                    comp.connect(bs.Point(-STROKE_WIDTH, -STROKE['length']))
-                    comp.connect(bs.Point(STROKE_WIDTH, STROKE['length'] - pathLen))
+                    comp.connect(bs.Point(0, pathLen - strokeWidth/2))
+                    comp.connect(bs.Point(-strokeWidth/2, strokeWidth/2))
+                    comp.connect(bs.Point(-strokeWidth, -STROKE['length']))
+                    comp.connect(bs.Point(strokeWidth, STROKE['length'] - pathLen))
                     comp.close()
-                    sCtrl = strokeCtrl(ctrl.pos, None, bpath[index+1].pos, unit)
+                    sCtrl = curveCtrl(ctrl.pos, None, bpath[index+1].pos)
                     pathList.append(bs.controlComp(sCtrl, comp, prePos, 2/3))
                 elif preDir == '2':
-                    sCtrl, corr = strokeCtrl(ctrl.pos, bpath[index-1].pos, bpath[index+1].pos, unit)
+                    sCtrl, corr = curveCtrl(ctrl.pos, bpath[index-1].pos, bpath[index+1].pos)
                     pathLen += corr
-                    comp.connect(bs.Point(0, pathLen - STROKE_WIDTH/2))
-                    comp.connect(bs.Point(-STROKE_WIDTH/2, STROKE_WIDTH/2))
-                    comp.connect(bs.Point(-STROKE_WIDTH, -STROKE['length']))
-                    comp.connect(bs.Point(STROKE_WIDTH/2, STROKE['length'] - pathLen))
+                    comp.connect(bs.Point(0, pathLen - strokeWidth/2))
+                    comp.connect(bs.Point(-strokeWidth/2, strokeWidth/2))
+                    comp.connect(bs.Point(-strokeWidth, -STROKE['length']))
+                    comp.connect(bs.Point(strokeWidth/2, STROKE['length'] - pathLen))
 
                     parallelPath[0][-1].pos.y -= corr
                     parallelPath[1][-1].pos.y -= corr
@@ -1344,37 +1841,19 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     parallelPath[0].close()
                     pathList.append(parallelPath[0])
                 else:
-                    raise 'undefine'
+                    raise undefined()
 
                 index = len(bpath)
             else:            
-                STROKE = {
-                    'length': 48,
-                    'h': [],
-                    'v': [
-                        14
-                    ],
-                    'start_1': 
-                    {
-                        'h':[
-                            20,
-                            8
-                        ],
-                        'v':[
-                            12,
-                            16,
-                            4
-                        ]
-                    }
-                }
+                STROKE = styles['3']
 
                 def comp1():
                     comp = bs.BezierPath()
                     comp.start(bs.Point(0, 0))
-                    comp.connect(bs.Point(STROKE_WIDTH / 2, 0))
-                    comp.connect(bs.Point(STROKE_WIDTH, pathLen - STROKE['length'] * ratio))
-                    comp.connect(bs.Point(-STROKE_WIDTH, STROKE['length'] * ratio))
-                    comp.connect(bs.Point(STROKE_WIDTH * -0.5, -STROKE['v'][0]))
+                    comp.connect(bs.Point(strokeWidth / 2, 0))
+                    comp.connect(bs.Point(strokeWidth, pathLen - STROKE['length'] * ratio))
+                    comp.connect(bs.Point(-strokeWidth, STROKE['length'] * ratio))
+                    comp.connect(bs.Point(strokeWidth * -0.5, -STROKE['v'][0]))
                     comp.close()
                     return comp
 
@@ -1401,7 +1880,7 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         else:
                             if not attrs['padding'] and attrs['dir'] == '1':
                                 if attrs['indexes'][1] == 0 and attrs['se'] == 0:
-                                    collCtrl = strokeCtrl(bpaths[attrs['indexes'][0]][attrs['indexes'][1]].pos, None, None, unit)
+                                    collCtrl = curveCtrl(skeletonPath(attrs['indexes'][0])[attrs['indexes'][1]].pos, None, None)
                                     pct = 12 / collCtrl.approximatedLength()
                                     corrPos = collCtrl.valueAt(collCtrl.inDistance(pct))
                                     prePos += corrPos
@@ -1412,30 +1891,30 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                                     # raise 'undefine'
                     for attrs in expInfo['back']:
                         if attrs['symbol'] == 'h':
-                            raise 'undefine'
+                            raise undefined()
                         elif attrs['symbol'] == 'v':
-                            raise 'undefine'
+                            raise undefined()
                         else:
                             if not attrs['padding']:
-                                raise 'undefine'
+                                raise undefined()
                     
                     areaLen = pathLen / 3
                     ratio = 1
                     if areaLen < STROKE['length']:
                         ratio = areaLen / STROKE['length']
-                    sCtrl = strokeCtrl(ctrl.pos, None, None, unit)
+                    sCtrl = curveCtrl(ctrl.pos, None, None)
 
                     comp = comp1()
 
                     pathList.append(bs.controlComp(sCtrl, comp, prePos, 1/3))
                 elif preDir == '*':
                     if nectDir == '2':
-                        sCtrl = strokeCtrl(ctrl.pos, None, bpath[index+1].pos, unit)
+                        sCtrl = curveCtrl(ctrl.pos, None, bpath[index+1].pos)
 
                         comp = bs.BezierPath()
                         comp.start(bs.Point(0, 0))
-                        comp.connect(bs.Point(STROKE_WIDTH/2, 300), p2=bs.Point(STROKE_WIDTH/2, 180))
-                        comp.connect(bs.Point(-STROKE_WIDTH, 0))
+                        comp.connect(bs.Point(strokeWidth/2, 300), p2=bs.Point(strokeWidth/2, 180))
+                        comp.connect(bs.Point(-strokeWidth, 0))
                         comp.connect(bs.Point(0, -300))
                         comp.close()
 
@@ -1447,10 +1926,10 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         temp = comp[2].reverse()
                         parallelPath[1].append(temp)
                     else:
-                        raise 'undefine'
+                        raise undefined()
                 elif nectDir == '*':
                     if preDir == '2':
-                        sCtrl, corr = strokeCtrl(ctrl.pos, preCtrl.pos, None, unit)
+                        sCtrl, corr = curveCtrl(ctrl.pos, preCtrl.pos, None)
                         parallelPath[0][-1].pos.y -= corr
                         parallelPath[1][-1].pos.y -= corr
                         prePos.y -= corr
@@ -1458,15 +1937,15 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
 
                         comp = bs.BezierPath()
                         comp.start(bs.Point(0, 0))
-                        comp.connect(bs.Point(STROKE_WIDTH/2, pathLen), p2=bs.Point(0, pathLen/2))
-                        comp.connect(bs.Point(STROKE_WIDTH/2, 0))
+                        comp.connect(bs.Point(strokeWidth/2, pathLen), p2=bs.Point(0, pathLen/2))
+                        comp.connect(bs.Point(strokeWidth/2, 0))
                         comp.connect(bs.Point(0, -pathLen))
 
                         comp = bs.controlComp(sCtrl, comp, prePos, 0.5)
                         parallelPath[0].connectPath(comp.reverse())
                     elif preDir == '1':
-                        sCtrl = strokeCtrl(ctrl.pos + bs.Point(-STROKE_WIDTH/2, STROKE_WIDTH/2), None, None, unit)
-                        comp = bs.controlComp(sCtrl, comp1(), prePos - bs.Point(-STROKE_WIDTH/2, STROKE_WIDTH/2), 1/3)
+                        sCtrl = curveCtrl(ctrl.pos + bs.Point(-strokeWidth/2, strokeWidth/2), None, None)
+                        comp = bs.controlComp(sCtrl, comp1(), prePos - bs.Point(-strokeWidth/2, strokeWidth/2), 1/3)
 
                         tempSplit = parallelPath[0][-1].intersections(parallelPath[0].posIn(len(parallelPath[0])-1), comp[1], comp.posIn(1))
                         parallelPath[0][-1] = parallelPath[0][-1].splitting(tempSplit[0][0])[0]
@@ -1485,32 +1964,32 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         comp = bs.BezierPath()
                         comp.start(bs.Point(0, 0))
                         comp.connect(bs.Point(0, pathLen))
-                        comp.connect(bs.Point(-STROKE_WIDTH/2, 0))
-                        comp.connect(bs.Point(-STROKE_WIDTH/2, -pathLen), p2=bs.Point(-STROKE_WIDTH/2, -pathLen/2))
+                        comp.connect(bs.Point(-strokeWidth/2, 0))
+                        comp.connect(bs.Point(-strokeWidth/2, -pathLen), p2=bs.Point(-strokeWidth/2, -pathLen/2))
                         
-                        sCtrl = strokeCtrl(ctrl.pos, None, None, unit)
+                        sCtrl = curveCtrl(ctrl.pos, None, None)
                         comp = bs.controlComp(sCtrl, comp, prePos, 0.5)
 
-                        tempSplit = comp[0].splitting(comp[0].roots(y=prePos.y+STROKE_WIDTH/2, pos=comp.startPos())[0])
+                        tempSplit = comp[0].splitting(comp[0].roots(y=prePos.y+strokeWidth/2, pos=comp.startPos())[0])
                         tempPos1 = comp.startPos() + tempSplit[0].pos
                         parallelPath[0].append(tempSplit[1])
                         parallelPath[0].append(comp[1])
 
-                        tempSplit = comp[2].splitting(comp[2].roots(y=prePos.y+STROKE_WIDTH/2, pos=comp.posIn(2))[0])
+                        tempSplit = comp[2].splitting(comp[2].roots(y=prePos.y+strokeWidth/2, pos=comp.posIn(2))[0])
                         tempPos2 = comp.posIn(2) + tempSplit[0].pos
-                        parallelPath[1][-1].pos.x -= tempPos1.x - tempPos2.x - STROKE_WIDTH
+                        parallelPath[1][-1].pos.x -= tempPos1.x - tempPos2.x - strokeWidth
                         parallelPath[1].append(tempSplit[0].reverse())
 
                         # parallelPath[0].connect(parallelPath[1].endPos() - parallelPath[0].endPos())
                     else:
-                        raise 'undefine'
+                        raise undefined()
                     
                     parallelPath[0].connectPath(parallelPath[1].reverse())
                     parallelPath[0].close()
                     pathList.append(parallelPath[0])
                 else:
                     if preDir == '2' and nectDir == '9':
-                        sCtrl, corr = strokeCtrl(ctrl.pos, preCtrl.pos, None, unit)
+                        sCtrl, corr = curveCtrl(ctrl.pos, preCtrl.pos, None)
                         parallelPath[0][-1].pos.y -= corr
                         parallelPath[1][-1].pos.y -= corr
                         prePos.y -= corr
@@ -1519,20 +1998,20 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         comp = bs.BezierPath()
                         comp.start(bs.Point(0, 0))
                         comp.connect(bs.Point(0, pathLen))
-                        comp.connect(bs.Point(-STROKE_WIDTH, 0))
+                        comp.connect(bs.Point(-strokeWidth, 0))
                         comp.connect(bs.Point(0, -pathLen))
 
                         comp = bs.controlComp(sCtrl, comp, prePos, 0.5)
                         parallelPath[1].append(comp[2].reverse())
                         parallelPath[0].append(comp[0])
                     elif preDir == '1' and nectDir == '4':
-                        sCtrl = strokeCtrl(ctrl.pos + bs.Point(0, STROKE_WIDTH/4), None, None, unit)
+                        sCtrl = curveCtrl(ctrl.pos + bs.Point(0, strokeWidth/4), None, None)
                         comp = bs.BezierPath()
                         comp.start(bs.Point(0, 0))
-                        comp.connect(bs.Point(STROKE_WIDTH/2, pathLen))
-                        comp.connect(bs.Point(-STROKE_WIDTH, 0))
+                        comp.connect(bs.Point(strokeWidth/2, pathLen))
+                        comp.connect(bs.Point(-strokeWidth, 0))
                         comp.connect(bs.Point(0, -pathLen))
-                        comp = bs.controlComp(sCtrl, comp, prePos - bs.Point(0, STROKE_WIDTH/4), 0.5)
+                        comp = bs.controlComp(sCtrl, comp, prePos - bs.Point(0, strokeWidth/4), 0.5)
 
                         tempSplit = parallelPath[0][-1].intersections(parallelPath[0].posIn(len(parallelPath[0])-1), comp[0], comp.posIn(0))
                         parallelPath[0][-1] = parallelPath[0][-1].splitting(tempSplit[0][0])[0]
@@ -1547,19 +2026,9 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                         parallelPath[1].connect(tempPos - parallelPath[1].endPos())
                         parallelPath[1].append(tempCtrls[1])
                     else:
-                        raise 'undefine'
+                        raise undefined()
         elif dir == '4':
-            STROKE = {
-                'length': 120,
-                'h': [
-                    4,
-                ],
-                'v': [
-                    18,
-                    10,
-                    10
-                ],
-            }
+            STROKE = styles['4']
 
             pathLen = -ctrl.pos.x
             expInfo = extendedInfo(currPos, ctrl.pos, index)
@@ -1573,134 +2042,99 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
                     pathLen = STROKE['length']
                 
             if preDir == '2' and nectDir == '*':
-                parallelPath[0][-1].pos.y += STROKE_WIDTH/2
-                parallelPath[0].connect(bs.Point(-STROKE_WIDTH/2, STROKE['v'][0]))
-                parallelPath[0].connect(bs.Point(-pathLen, -STROKE['v'][0] - STROKE_WIDTH ))
+                parallelPath[0][-1].pos.y += strokeWidth/2
+                parallelPath[0].connect(bs.Point(-strokeWidth/2, STROKE['v'][0]))
+                parallelPath[0].connect(bs.Point(-pathLen, -STROKE['v'][0] - strokeWidth ))
                 parallelPath[0].connect(bs.Point(STROKE['h'][0], -STROKE['v'][1]))
-                parallelPath[0].connect(bs.Point(pathLen - STROKE['h'][0] - STROKE_WIDTH/2, STROKE_WIDTH/2 + STROKE['v'][1] - STROKE['v'][2]))
+                parallelPath[0].connect(bs.Point(pathLen - STROKE['h'][0] - strokeWidth/2, strokeWidth/2 + STROKE['v'][1] - STROKE['v'][2]))
                 parallelPath[1][-1].pos.y -= STROKE['v'][2]
                 
                 parallelPath[0].connectPath(parallelPath[1].reverse())
                 parallelPath[0].close()
                 pathList.append(parallelPath[0])
             elif preDir == '3' and nectDir == '*':
-                parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=prePos.y-STROKE_WIDTH/2, pos=parallelPath[1].posIn(len(parallelPath[1])-1))[0])[0]
+                parallelPath[1][-1] = parallelPath[1][-1].splitting(parallelPath[1][-1].roots(y=prePos.y-strokeWidth/2, pos=parallelPath[1].posIn(len(parallelPath[1])-1))[0])[0]
                 parallelPath[1].connect(bs.Point(prePos.x - parallelPath[1].endPos().x - pathLen, 0))
-                parallelPath[1].connect(bs.Point(0, STROKE_WIDTH/4))
-                parallelPath[1].connect(prePos + bs.Point(0, STROKE_WIDTH) - parallelPath[1].endPos())
+                parallelPath[1].connect(bs.Point(0, strokeWidth/4))
+                parallelPath[1].connect(prePos + bs.Point(0, strokeWidth) - parallelPath[1].endPos())
 
                 parallelPath[0].connect(parallelPath[1].endPos() - parallelPath[0].endPos())
                 parallelPath[0].connectPath(parallelPath[1].reverse())
                 parallelPath[0].close()
                 pathList.append(parallelPath[0])
             else:
-                raise 'undefine'
+                raise undefined()
         elif dir == '9':
-            STROKE = {
-                'start': [
-                    {
-                        'length': 64,
-                        'h': [
-                            36
-                        ],
-                        'v': [
-                            8,
-                            40
-                        ],
-                    },
-                    {
-                        'h': [
-                            24,
-                            40,
-                            4,
-                            16
-                        ],
-                        'v': [
-                            6,
-                            36
-                        ],
-                    }
-                ],
-                'end': {
-                    'length': 64,
-                    'h': [
-                        18
-                    ],
-                    'v': [
-                        34,
-                        18
-                    ],
-                }
-            }
+            STROKE = styles['9']
 
             pathLen = ctrl.pos.distance()
             expandVec = ctrl.pos.normalization()
             if preDir == '*':
                 expInfo = extendedInfo(prePos, -ctrl.pos, index)
                 if len(expInfo['front']) or len(expInfo['back']):
-                    raise 'undefine'
+                    raise undefined()
                 
                 pathLen += STROKE['start'][0]['h'][0]
                 if True: #ctrl.pos.x > -ctrl.pos.y:
                     rotate = ctrl.pos.radian()
 
-                    parallelPath[0].start(prePos + bs.Point(-STROKE['start'][0]['h'][0], STROKE_WIDTH/2 - STROKE['start'][0]['v'][1] - STROKE['start'][0]['v'][0]).rotate(rotate))
-                    parallelPath[0].connect(bs.Point(STROKE['start'][0]['length'], STROKE['start'][0]['v'][1]+STROKE['start'][0]['v'][0]-STROKE_WIDTH).rotate(rotate))
-                    parallelPath[1].start(prePos + bs.Point(-STROKE['start'][0]['h'][0], STROKE_WIDTH/2 - STROKE['start'][0]['v'][1] - STROKE['start'][0]['v'][0]).rotate(rotate))
+                    parallelPath[0].start(prePos + bs.Point(-STROKE['start'][0]['h'][0], strokeWidth/2 - STROKE['start'][0]['v'][1] - STROKE['start'][0]['v'][0]).rotate(rotate))
+                    parallelPath[0].connect(bs.Point(STROKE['start'][0]['length'], STROKE['start'][0]['v'][1]+STROKE['start'][0]['v'][0]-strokeWidth).rotate(rotate))
+                    parallelPath[1].start(prePos + bs.Point(-STROKE['start'][0]['h'][0], strokeWidth/2 - STROKE['start'][0]['v'][1] - STROKE['start'][0]['v'][0]).rotate(rotate))
                     parallelPath[1].connect(bs.Point(0, STROKE['start'][0]['v'][0]).rotate(rotate))
                     parallelPath[1].connect(bs.Point(STROKE['start'][0]['h'][0], STROKE['start'][0]['v'][1]).rotate(rotate))
                 else:
                     if nectDir != '*':
-                        raise 'undefine'
-                    parallelPath[0].start(prePos + expandVec.perpendicular() * STROKE_WIDTH/2)
-                    parallelPath[1].start(prePos + expandVec.perpendicular() * STROKE_WIDTH/2)
+                        raise undefined()
+                    parallelPath[0].start(prePos + expandVec.perpendicular() * strokeWidth/2)
+                    parallelPath[1].start(prePos + expandVec.perpendicular() * strokeWidth/2)
                     parallelPath[1].connect(bs.Point(-STROKE['start'][1]['h'][0], 0))
                     parallelPath[1].connect(bs.Point(0, STROKE['start'][1]['v'][0]))
                     parallelPath[1].connect(bs.Point(STROKE['start'][1]['h'][1], STROKE['start'][1]['v'][1]))
                     parallelPath[1].connect(bs.Point(STROKE['start'][1]['h'][2], 0))
-                    parallelPath[1].connect(prePos - expandVec.perpendicular() * STROKE_WIDTH/2 - parallelPath[1].endPos() + bs.Point(STROKE['start'][1]['h'][3], 0))
+                    parallelPath[1].connect(prePos - expandVec.perpendicular() * strokeWidth/2 - parallelPath[1].endPos() + bs.Point(STROKE['start'][1]['h'][3], 0))
                 
-                # parallelPath[1][-1].pos.y -= STROKE_WIDTH/2
-                # parallelPath[1][-1].pos += parallelPath[0].endPos() - expandVec.perpendicular() * STROKE_WIDTH/2 - parallelPath[1].endPos()
+                # parallelPath[1][-1].pos.y -= strokeWidth/2
+                # parallelPath[1][-1].pos += parallelPath[0].endPos() - expandVec.perpendicular() * strokeWidth/2 - parallelPath[1].endPos()
             elif preDir == '3':
-                tempPos = ctrl.pos.normalization().perpendicular() * STROKE_WIDTH * 1.5 + prePos
+                tempPos = ctrl.pos.normalization().perpendicular() * strokeWidth * 1.5 + prePos
                 tempSplit = parallelPath[0][-1].intersections(parallelPath[0].posIn(len(parallelPath[0])-1), bs.BezierCtrl((tempPos - currPos) * 2), currPos)
                 parallelPath[0][-1] = parallelPath[0][-1].splitting(tempSplit[0][0])[0]
                 parallelPath[1].connect(prePos - parallelPath[1].endPos())
             elif preDir == '2':
                 tempDir = ctrl.pos.normalization()
-                tempPos1 = prePos - tempDir * STROKE_WIDTH + tempDir.perpendicular() * STROKE_WIDTH
-                tempPos2 = currPos - tempDir.perpendicular() * STROKE_WIDTH/4
-                interPos = bs.intersection(tempPos1, tempPos2, bs.Point(prePos.x+STROKE_WIDTH/2, prePos.y), bs.Point(prePos.x+STROKE_WIDTH/2, currPos.y))
+                tempPos1 = prePos - tempDir * strokeWidth + tempDir.perpendicular() * strokeWidth
+                tempPos2 = currPos - tempDir.perpendicular() * strokeWidth/4
+                interPos = bs.intersection(tempPos1, tempPos2, bs.Point(prePos.x+strokeWidth/2, prePos.y), bs.Point(prePos.x+strokeWidth/2, currPos.y))
                 parallelPath[0][-1].pos.y -= prePos.y - interPos.y
-                interPos = bs.intersection(tempPos1, tempPos2, bs.Point(prePos.x-STROKE_WIDTH/2, prePos.y), bs.Point(prePos.x-STROKE_WIDTH/2, currPos.y))
+                interPos = bs.intersection(tempPos1, tempPos2, bs.Point(prePos.x-strokeWidth/2, prePos.y), bs.Point(prePos.x-strokeWidth/2, currPos.y))
                 parallelPath[1][-1].pos.y -= prePos.y - interPos.y
                 parallelPath[1].connect(tempPos1 - interPos)
-                parallelPath[1].connect(tempDir.perpendicular() * STROKE_WIDTH * -1.5)
+                parallelPath[1].connect(tempDir.perpendicular() * strokeWidth * -1.5)
             else:
-                raise 'undefine'
+                raise undefined()
             
             if nectDir == '*':
                 parallelPath[0].connect(currPos - parallelPath[0].endPos())
-                parallelPath[1].connect(currPos + expandVec.perpendicular() * -STROKE_WIDTH/2 - parallelPath[1].endPos())
+                parallelPath[1].connect(currPos + expandVec.perpendicular() * -strokeWidth/2 - parallelPath[1].endPos())
 
                 parallelPath[0].connect(parallelPath[1].endPos() - parallelPath[0].endPos())
                 parallelPath[0].connectPath(parallelPath[1].reverse())
                 parallelPath[0].close()
                 pathList.append(parallelPath[0])
             elif nectDir == '2':
-                parallelPath[0].connect(currPos + expandVec.perpendicular() * STROKE_WIDTH/2 - parallelPath[0].endPos())
-                parallelPath[1].connect(currPos + expandVec.perpendicular() * -STROKE_WIDTH/2 - parallelPath[1].endPos())
+                parallelPath[0].connect(currPos + expandVec.perpendicular() * strokeWidth/2 - parallelPath[0].endPos())
+                parallelPath[1].connect(currPos + expandVec.perpendicular() * -strokeWidth/2 - parallelPath[1].endPos())
                 
-                backup = STROKE_WIDTH/2 / math.cos(ctrl.pos.radian())
+                backup = strokeWidth/2 / math.cos(ctrl.pos.radian())
                 parallelPath[0][-1].pos -= expandVec * backup
-                parallelPath[0].connect(bs.Point(STROKE_WIDTH/2, -STROKE_WIDTH/2))
-                parallelPath[0].connect(bs.Point(STROKE_WIDTH/2 + STROKE['end']['h'][0], STROKE['end']['v'][0]))
+                parallelPath[0].connect(bs.Point(strokeWidth/2, -strokeWidth/2))
+                parallelPath[0].connect(bs.Point(strokeWidth/2 + STROKE['end']['h'][0], STROKE['end']['v'][0]))
                 parallelPath[0].connect(bs.Point(-STROKE['end']['h'][0], STROKE['end']['v'][1]))
                 
                 parallelPath[1][-1].pos -= expandVec * backup
         else:
-            raise Exception('Undefine stroke dir!')
+            raise undefined('undefined stroke direction')
 
         preCtrl = ctrl
         preDir = dir
@@ -1709,34 +2143,907 @@ def toStrokes(bpath, strokeWidth, p_map, view, scale, npath, bpaths):
 
     return pathList
 
-def writeTempGlyphFromShapes(shapes, fileName, tag, attrib):
+def newGlyphRoot(tag, attrib):
     newRoot = svgfile.ET.Element(tag, attrib)
     newRoot.text = '\n'
     styleElem = svgfile.ET.Element('style', { 'type': 'text/css' })
     styleElem.text = '.st0{fill:#000000;}'
     styleElem.tail = '\n'
     newRoot.append(styleElem)
+    return newRoot
 
+def writeTempGlyphFromShapes(shapes, fileName, tag, attrib):
+    newRoot = newGlyphRoot(tag, attrib)
     for shape in shapes:
         newRoot.append(shape.toSvgElement({ 'class': 'st0' }))
     newTree = svgfile.ET.ElementTree(newRoot)
     newTree.write(fileName, encoding = "utf-8", xml_declaration = True)
 
-def testChar(char):
-    data = loadJson(DATA_FILE)
-    scale, p_map, bpaths = getCharData(data[char], FONT_SIZE)
-    view = getStrucView(bpaths, p_map)
+# Contours are plain tuples so they can cross process boundaries:
+# (start, segments), a segment being (x, y) for lines or (x1, y1, x2, y2, x, y) for cubics.
+def shapeContours(shape):
+    contours = []
+    for path in shape:
+        pos = path.startPos()
+        x, y = pos.x, pos.y
+        start = (x, y)
+        segments = []
+        for ctrl in path:
+            end, p1, p2 = ctrl.pos, ctrl.p1, ctrl.p2
+            if p1.x == 0 and p1.y == 0 and p2.x == end.x and p2.y == end.y:
+                segments.append((x + end.x, y + end.y))
+            else:
+                segments.append((x + p1.x, y + p1.y, x + p2.x, y + p2.y, x + end.x, y + end.y))
+            x += end.x
+            y += end.y
+        contours.append((start, segments))
+    return contours
+
+def contoursToSvgPath(contours):
+    d = []
+    for start, segments in contours:
+        d.append('M%g,%g' % tuple(start))
+        for seg in segments:
+            if len(seg) == 2:
+                d.append('L%g,%g' % tuple(seg))
+            else:
+                d.append('C%g,%g,%g,%g,%g,%g' % tuple(seg))
+        d.append('Z')
+    return ''.join(d)
+
+def writeTempGlyphFromContours(contours, fileName, tag, attrib):
+    newRoot = newGlyphRoot(tag, attrib)
+    if len(contours):
+        newRoot.append(svgfile.ET.Element('path', { 'class': 'st0', 'd': contoursToSvgPath(contours) }))
+    newTree = svgfile.ET.ElementTree(newRoot)
+    newTree.write(fileName, encoding = "utf-8", xml_declaration = True)
+
+# Collects pen drawing (skia-pathops) back into contours
+class ContourPen:
+    def __init__(self):
+        self.contours = []
+        self.current = None
+
+    def moveTo(self, pt):
+        self.current = (tuple(pt), [])
+        self.contours.append(self.current)
+
+    def lineTo(self, pt):
+        self.current[1].append(tuple(pt))
+
+    def curveTo(self, *pts):
+        self.current[1].append(tuple(pts[0]) + tuple(pts[1]) + tuple(pts[2]))
 
-    shapes = []
-    for i, bpath in enumerate(bpaths):
-        shape = bs.BezierShape()
-        shape.extend(toStrokes(bpath, STROKE_WIDTH, p_map, view, scale, i, bpaths))
-        shape.transform(move=bs.Point(FONT_SIZE * (1-GLYPFH_WIDTH) / 2))
-        shapes.append(shape)
+    def qCurveTo(self, *pts):
+        start = self.current[1][-1][-2:] if self.current[1] else self.current[0]
+        ctrl, end = pts[0], pts[1]
+        self.current[1].append((start[0] + (ctrl[0] - start[0]) * 2/3, start[1] + (ctrl[1] - start[1]) * 2/3,
+            end[0] + (ctrl[0] - end[0]) * 2/3, end[1] + (ctrl[1] - end[1]) * 2/3, end[0], end[1]))
+
+    def closePath(self):
+        self.current = None
+
+    endPath = closePath
+
+def drawContoursToPen(pen, contours):
+    for start, segments in contours:
+        pen.moveTo(tuple(start))
+        for seg in segments:
+            if len(seg) == 2:
+                pen.lineTo(tuple(seg))
+            else:
+                pen.curveTo((seg[0], seg[1]), (seg[2], seg[3]), (seg[4], seg[5]))
+        pen.closePath()
+
+# Outer contours come out clockwise on screen, which is what fontforge and glyf expect once y is flipped
+def removeContourOverlaps(contours):
+    import pathops
+    path = pathops.Path()
+    drawContoursToPen(path.getPen(), contours)
+    path = pathops.simplify(path, fix_winding=True, keep_starting_points=True)
+    pen = ContourPen()
+    path.draw(pen)
+    return pen.contours
+
+def hasPathops():
+    try:
+        import pathops
+    except ImportError:
+        return False
+    return True
+
+# True when the fontforge build removes overlaps per glyph with skia-pathops in the outline workers,
+# False when fontforge removes them after import
+def overlapRemoval():
+    method = OVERLAP_REMOVAL
+    if method == 'auto':
+        method = 'pathops' if hasPathops() else 'fontforge'
+    if method == 'pathops':
+        import pathops
+        print("overlaps are removed per glyph with skia-pathops %s" % pathops.__version__)
+        return True
+    print("overlaps are removed by fontforge")
+    return False
+
+def reverseContours(contours):
+    reversed = []
+    for start, segments in contours:
+        ends = [tuple(start)] + [tuple(seg[-2:]) for seg in segments]
+        # Walking backwards the implicit closing line comes first
+        newSegments = [] if ends[-1] == ends[0] else [ends[-1]]
+        for i in range(len(segments) - 1, -1, -1):
+            seg = segments[i]
+            if len(seg) == 2:
+                newSegments.append(ends[i])
+            else:
+                newSegments.append((seg[2], seg[3], seg[0], seg[1]) + ends[i])
+        reversed.append((tuple(start), newSegments))
+    return reversed
+
+def flipContours(contours, ascent):
+    return [((start[0], ascent - start[1]), [tuple(seg[i] if i % 2 == 0 else ascent - seg[i] for i in range(len(seg))) for seg in segments]) for start, segments in contours]
+
+# A weight is (name, strokeWidth, styles), the name is None for the plain single weight build
+def loadWeights(file):
+    weights = []
+    for conf in loadJson(file):
+        styles = loadStrokeStyles(conf['style']) if conf.get('style') else None
+        weights.append((conf['name'], conf.get('width', STROKE_WIDTH), styles))
+    return weights
+
+# Wall time per build stage and per glyph, stages running in the outline workers are
+# timed there and handed back with the outlines
+class BuildProfile:
+    def __init__(self):
+        self.stages = {}
+        self.glyphs = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds, char=None):
+        count, total = self.stages.get(stage, (0, 0.0))
+        self.stages[stage] = (count + 1, total + seconds)
+        if char is not None:
+            times = self.glyphs.setdefault(char, {})
+            times[stage] = times.get(stage, 0.0) + seconds
+
+    def addGlyph(self, char, timings):
+        for stage, seconds in timings.items():
+            self.add(stage, seconds, char)
+
+    @contextlib.contextmanager
+    def stage(self, stage, char=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, char)
+
+    def slowest(self, num):
+        return sorted(self.glyphs.items(), key=lambda item: sum(item[1].values()), reverse=True)[:num]
+
+    def summary(self, num=10):
+        return {
+            'wall': time.perf_counter() - self.started,
+            'stages': { stage: { 'count': count, 'total': total } for stage, (count, total) in self.stages.items() },
+            'glyphs': len(self.glyphs),
+            'slowest': [{ 'char': char, 'total': sum(times.values()), 'stages': times } for char, times in self.slowest(num)],
+        }
 
-    writeTempGlyphFromShapes(shapes, TEMP_GLYPH_FILE, 'svg', GLYPH_ATTRIB)
+    def report(self, num=10):
+        summary = self.summary(num)
+        print("\nbuild time %.2fs, %d glyphs timed" % (summary['wall'], summary['glyphs']))
+        print("%-16s %8s %10s %10s" % ('stage', 'count', 'total s', 'mean ms'))
+        for stage, info in sorted(summary['stages'].items(), key=lambda item: -item[1]['total']):
+            print("%-16s %8d %10.3f %10.3f" % (stage, info['count'], info['total'], info['total'] / info['count'] * 1000))
+        if summary['slowest']:
+            print("slowest glyphs:")
+            for info in summary['slowest']:
+                print("  %s %d %8.2f ms  %s" % (info['char'], ord(info['char']), info['total'] * 1000,
+                    ', '.join('%s %.2f' % (stage, seconds * 1000) for stage, seconds in info['stages'].items())))
+        return summary
+
+def setProfile(profile):
+    global PROFILE
+    PROFILE = profile
+
+def profileStage(stage, char=None):
+    if PROFILE is None:
+        return contextlib.nullcontext()
+    return PROFILE.stage(stage, char)
+
+def skeletonPoints(bpath):
+    pos = bpath.startPos()
+    points = [(pos.x, pos.y)]
+    for ctrl in bpath:
+        pos = pos + ctrl.pos
+        points.append((pos.x, pos.y))
+    return points
+
+# Paths whose segment boxes touch, as (indexes, origin, skeleton) with the points of the
+# skeleton relative to the origin. Any cell of the structure view two paths share lies
+# in a segment box of each of them.
+def skeletonComponents(bpaths):
+    points = [skeletonPoints(bpath) for bpath in bpaths]
+    segments = []
+    for i, path in enumerate(points):
+        for a, b in zip(path, path[1:]):
+            segments.append((i, (min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1]))))
+
+    parent = list(range(len(bpaths)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    # Sweep along x, a segment only meets those starting before it ends
+    segments.sort(key=lambda segment: segment[1][0])
+    for n, (i, (x0, y0, x1, y1)) in enumerate(segments):
+        for j, (u0, v0, u1, v1) in itertools.islice(segments, n + 1, None):
+            if u0 > x1:
+                break
+            if y0 <= v1 and v0 <= y1:
+                parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(bpaths)):
+        groups.setdefault(find(i), []).append(i)
+    components = []
+    for indexes in groups.values():
+        ox = min(x for i in indexes for x, _ in points[i])
+        oy = min(y for i in indexes for _, y in points[i])
+        components.append((indexes, (ox, oy), tuple(tuple((x - ox, y - oy) for x, y in points[i]) for i in indexes)))
+    return components
+
+def styleLengths(style):
+    if isinstance(style, dict):
+        for key, value in style.items():
+            if key == 'length':
+                yield value
+            else:
+                yield from styleLengths(value)
+    elif isinstance(style, tuple):
+        for value in style:
+            yield from styleLengths(value)
+
+# strucInfo results with the paths numbered within the component, None when they see
+# another one. toStrokes caps what it takes of an extend at a style length, the stroke
+# width or a unit, so extends past reach, twice the largest of them, are all the same.
+def componentInfo(front, back, extend, areaLen, rank, reach):
+    if extend is None or not isinstance(extend, list) and extend > reach:
+        extend = reach
+    records = []
+    for cell in front, back:
+        if any(attrs['indexes'][0] not in rank for attrs in cell):
+            return None
+        records.append(tuple((attrs['symbol'], rank[attrs['indexes'][0]], attrs['indexes'][1], attrs['padding'], attrs.get('dir'), attrs.get('se')) for attrs in cell))
+    return records[0], records[1], tuple(extend) if isinstance(extend, list) else extend, areaLen
+
+def moveContours(contours, dx, dy):
+    if dx == 0 and dy == 0:
+        return contours
+    return [((start[0] + dx, start[1] + dy), [tuple(v + dy if k % 2 else v + dx for k, v in enumerate(seg)) for seg in segments]) for start, segments in contours]
+
+def queryTree(steps, leaf):
+    node = leaf
+    for query, info in reversed(steps):
+        node = (query, { info: node })
+    return node
+
+# Stroke outlines of components, paths touching each other, shared between the chars
+# they appear in. toStrokes only sees the rest of the char through extendedInfo and
+# asks the same questions as long as it gets the same answers, so the entries of a
+# skeleton form a tree of the queries relative to its corner, branching on what the
+# structure view answered, with the outlines at the leaves. A char reuses the leaf
+# its own view leads to. Components whose answers reach another component are not
+# stored. Entries live in the process, a full cache is dropped. It is off unless a
+# size is given: the key holds the scale and the placed skeleton, so the same radical
+# at another size or stretch is a miss and few chars are served from it.
+class ComponentCache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = {}
+        self.seen = set()
+        self.leaves = 0
+        self.styles = {}
+        self.stats = { 'hits': 0, 'misses': 0, 'crowded': 0 }
+
+    # The key of the weight and the reach of extends in it
+    def weight(self, strokeWidth, styles, offset, scale):
+        # Stroke styles are read-only, what is derived from them is kept while the object lives
+        styles = styles or STROKE_STYLES
+        known = self.styles.get(id(styles))
+        if known is None or known[0] is not styles:
+            known = self.styles[id(styles)] = (styles, hashJson(styles), max(styleLengths(styles)))
+        reach = 2 * max(scale['v'] * FONT_SIZE, strokeWidth, known[2])
+        return (known[1], strokeWidth, offset, scale['h'], scale['v']), reach
+
+    def answer(self, view, p_map, strokeWidth, indexes, origin, query, rank, reach):
+        k, (x, y), tangent, nctrl = query
+        try:
+            info = strucInfo(view, p_map, strokeWidth, indexes[k], bs.Point(x + origin[0], y + origin[1]), bs.Point(*tangent), nctrl)
+        except KeyError:
+            return None
+        return componentInfo(info['front'], info['back'], info.get('extend'), info.get('areaLen'), rank, reach)
+
+    # Outlines of the reused paths by index and the (key, origin, indexes, reach) of the components to compute
+    def lookup(self, components, view, p_map, scale, strokeWidth, styles, offset):
+        weight, reach = self.weight(strokeWidth, styles, offset, scale)
+        found = {}
+        missing = []
+        for indexes, origin, skeleton in components:
+            key = (weight, skeleton)
+            rank = { i: k for k, i in enumerate(indexes) }
+            node = self.entries.get(key)
+            while node is not None and node[0] is not None:
+                query, answers = node
+                node = answers.get(self.answer(view, p_map, strokeWidth, indexes, origin, query, rank, reach))
+            if node is None:
+                self.stats['misses'] += 1
+                # Stored the second time around, most components are used once
+                if key in self.seen or key in self.entries:
+                    missing.append((key, origin, indexes, reach))
+                else:
+                    if len(self.seen) >= self.size:
+                        self.seen.clear()
+                    self.seen.add(key)
+                continue
+            self.stats['hits'] += 1
+            _, stored, outlines = node
+            for i, contours in zip(indexes, outlines):
+                found[i] = moveContours(contours, origin[0] - stored[0], origin[1] - stored[1])
+        return found, missing
+
+    # logs are the infoLog of toStrokes for every computed path
+    def store(self, missing, outlines, logs):
+        for key, origin, indexes, reach in missing:
+            rank = { i: k for k, i in enumerate(indexes) }
+            steps = []
+            for k, i in enumerate(indexes):
+                for (x, y), tangent, nctrl, seen in logs[i]:
+                    steps.append(((k, (x - origin[0], y - origin[1]), tangent, nctrl), componentInfo(*seen, rank, reach)))
+            if any(info is None for _, info in steps):
+                self.stats['crowded'] += 1
+                continue
 
-def testAllChar():
+            if self.leaves >= self.size:
+                self.entries.clear()
+                self.seen.clear()
+                self.leaves = 0
+            leaf = (None, origin, [outlines[i] for i in indexes])
+            node = self.entries.get(key)
+            if node is None:
+                self.entries[key] = queryTree(steps, leaf)
+                self.leaves += 1
+                continue
+            for n, (query, info) in enumerate(steps):
+                if node[0] != query:
+                    # A leaf or another query, toStrokes did not run this way before
+                    break
+                child = node[1].get(info)
+                if child is None:
+                    node[1][info] = queryTree(steps[n+1:], leaf)
+                    self.leaves += 1
+                    break
+                node = child
+
+def setComponentCache(size):
+    global COMPONENT_CACHE_SIZE, COMPONENT_CACHE
+    COMPONENT_CACHE_SIZE = size
+    COMPONENT_CACHE = None
+
+def componentCache():
+    global COMPONENT_CACHE
+    if COMPONENT_CACHE is None and COMPONENT_CACHE_SIZE:
+        COMPONENT_CACHE = ComponentCache(COMPONENT_CACHE_SIZE)
+    return COMPONENT_CACHE
+
+# The skeleton and structure view are computed once and shared by every weight
+def genGlyphOutlines(item, offset=GLYPH_OFFSET, weights=DEFAULT_WEIGHTS, removeOverlaps=False):
+    name, attrs = item
+    timings = {}
+    start = time.perf_counter()
+    try:
+        scale, p_map, bpaths = getCharData(attrs, FONT_SIZE)
+        mid = time.perf_counter()
+        view = getStrucView(bpaths, p_map)
+        timings.update(getCharData=mid - start, getStrucView=time.perf_counter() - mid)
+    except Exception as e:
+        return name, [([], e)] * len(weights), timings
+
+    def addTime(stage, start):
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    cache = componentCache()
+    if cache is not None:
+        start = time.perf_counter()
+        components = skeletonComponents(bpaths)
+        addTime('components', start)
+
+    results = []
+    for _, strokeWidth, styles in weights:
+        contours = []
+        error = None
+        found, missing = {}, []
+        if cache is not None:
+            start = time.perf_counter()
+            found, missing = cache.lookup(components, view, p_map, scale, strokeWidth, styles, offset)
+            addTime('components', start)
+        outlines = {}
+        logs = { i: [] for _, _, indexes, _ in missing for i in indexes }
+        stage, start = 'toStrokes', time.perf_counter()
+        try:
+            for i, bpath in enumerate(bpaths):
+                if i in found:
+                    contours.extend(found[i])
+                    continue
+                shape = bs.BezierShape()
+                shape.extend(toStrokes(bpath, strokeWidth, p_map, view, scale, i, bpaths, styles, logs.get(i)))
+                shape.transform(move=bs.Point(offset))
+                outlines[i] = shapeContours(shape)
+                contours.extend(outlines[i])
+            if missing:
+                cache.store(missing, outlines, logs)
+            addTime(stage, start)
+            if removeOverlaps and contours:
+                stage, start = 'removeOverlap', time.perf_counter()
+                contours = removeContourOverlaps(contours)
+                addTime(stage, start)
+        except Exception as e:
+            addTime(stage, start)
+            error = e
+        results.append((contours, error))
+
+    return name, results, timings
+
+def outlineResult(result):
+    name, results, timings = result
+    if PROFILE is not None:
+        PROFILE.addGlyph(name, timings)
+    return name, results
+
+# The glyph was lost together with its worker process. It is not cached, so the next build tries again.
+class GlyphWorkerError(Exception):
+    pass
+
+# The cache size is passed on rather than inherited, so spawned workers use it too
+def outlineWorker(conn, worker, componentCacheSize):
+    setComponentCache(componentCacheSize)
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        seq, item = task
+        name, results, timings = worker(item)
+        try:
+            conn.send((seq, (name, results, timings)))
+        except Exception:
+            # Errors that do not pickle are passed on as text
+            results = [(contours, None if error is None else RuntimeError(repr(error))) for contours, error in results]
+            conn.send((seq, (name, results, timings)))
+
+# Runs the outline workers as separate processes fed a few glyphs at a time. A worker
+# that spends more than budget seconds on one glyph, or dies, is killed and replaced,
+# the glyph gets an error result and the glyphs queued behind it go to other workers.
+class OutlineSupervisor:
+    def __init__(self, jobs, worker, failed, budget=DEFAULT_GLYPH_TIME_BUDGET):
+        self.worker = worker
+        self.failed = failed
+        self.budget = budget
+        self.slots = [self.spawn() for i in range(jobs)]
+
+    def spawn(self):
+        conn, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=outlineWorker, args=(child, self.worker, COMPONENT_CACHE_SIZE), daemon=True)
+        process.start()
+        child.close()
+        return { 'process': process, 'conn': conn, 'tasks': deque(), 'started': None }
+
+    def restart(self, slot, error, retry):
+        slot['process'].kill()
+        slot['process'].join()
+        slot['conn'].close()
+        seq, item = slot['tasks'].popleft()
+        retry.extendleft(reversed(slot['tasks']))
+        self.slots[self.slots.index(slot)] = self.spawn()
+        return seq, self.failed(item, error)
+
+    def imap(self, items):
+        items = iter(items)
+        retry = deque()
+        done = {}
+        nextSeq = 0
+        yieldSeq = 0
+        exhausted = False
+        try:
+            while True:
+                now = time.monotonic()
+                for slot in self.slots:
+                    while len(slot['tasks']) < SUPERVISOR_PREFETCH:
+                        if retry:
+                            task = retry.popleft()
+                        elif exhausted or nextSeq - yieldSeq >= OUTLINE_WINDOW * len(self.slots):
+                            break
+                        else:
+                            item = next(items, None)
+                            if item is None:
+                                exhausted = True
+                                break
+                            task = (nextSeq, item)
+                            nextSeq += 1
+                        slot['conn'].send(task)
+                        slot['tasks'].append(task)
+                        if slot['started'] is None:
+                            slot['started'] = now
+
+                busy = [slot for slot in self.slots if slot['tasks']]
+                if not busy:
+                    break
+                timeout = None
+                if self.budget:
+                    timeout = max(0, min(slot['started'] for slot in busy) + self.budget - now)
+                ready = multiprocessing.connection.wait([slot['conn'] for slot in busy], timeout)
+
+                now = time.monotonic()
+                for slot in busy:
+                    if slot['conn'] in ready:
+                        try:
+                            while slot['conn'].poll():
+                                seq, result = slot['conn'].recv()
+                                slot['tasks'].popleft()
+                                done[seq] = result
+                        except (EOFError, OSError):
+                            slot['process'].join(1)
+                            seq, result = self.restart(slot, GlyphWorkerError('worker process died (exit code %s)' % slot['process'].exitcode), retry)
+                            done[seq] = result
+                            continue
+                        slot['started'] = now if slot['tasks'] else None
+                    elif self.budget and now - slot['started'] >= self.budget:
+                        seq, result = self.restart(slot, GlyphWorkerError('no outline after %gs, worker restarted' % self.budget), retry)
+                        done[seq] = result
+
+                while yieldSeq in done:
+                    yield done.pop(yieldSeq)
+                    yieldSeq += 1
+        finally:
+            self.close()
+
+    def close(self):
+        for slot in self.slots:
+            try:
+                slot['conn'].send(None)
+            except OSError:
+                pass
+        for slot in self.slots:
+            slot['process'].join(1)
+            if slot['process'].is_alive():
+                slot['process'].kill()
+                slot['process'].join()
+            slot['conn'].close()
+        self.slots = []
+
+def genOutlines(items, jobs=1, offset=GLYPH_OFFSET, weights=DEFAULT_WEIGHTS, removeOverlaps=False):
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count()
+    worker = partial(genGlyphOutlines, offset=offset, weights=weights, removeOverlaps=removeOverlaps)
+    budget = GLYPH_TIME_BUDGET
+    if budget is None:
+        # Without an explicit budget a single job stays in process, stroke errors keep their tracebacks
+        budget = DEFAULT_GLYPH_TIME_BUDGET if jobs > 1 else 0
+    if budget:
+        def failed(item, error):
+            return item[0], [([], error)] * len(weights), {}
+        supervisor = OutlineSupervisor(jobs, worker, failed, budget)
+        for result in supervisor.imap(items):
+            yield outlineResult(result)
+    elif jobs == 1:
+        for item in items:
+            yield outlineResult(worker(item))
+    else:
+        # imap keeps the input order, so glyphs are imported deterministically.
+        # It would also drain a lazy input at once, so items are fed a window at a time.
+        items = iter(items)
+        with multiprocessing.Pool(jobs, setComponentCache, (COMPONENT_CACHE_SIZE,)) as pool:
+            while True:
+                window = list(itertools.islice(items, OUTLINE_WINDOW * jobs))
+                if not window:
+                    break
+                for result in pool.imap(worker, window, chunksize=8):
+                    yield outlineResult(result)
+
+def hashJson(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def sourceHash(files):
+    digest = hashlib.sha1()
+    for file in files:
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+# Sources of the roots and of every function and class of this module they name, followed
+# through the functions and classes found on the way
+def reachedSources(roots):
+    sources = {}
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if obj.__name__ in sources:
+            continue
+        sources[obj.__name__] = inspect.getsource(obj)
+        codes = [obj.__code__] if inspect.isfunction(obj) else [f.__code__ for f in vars(obj).values() if inspect.isfunction(f)]
+        while codes:
+            code = codes.pop()
+            codes.extend(c for c in code.co_consts if inspect.iscode(c))
+            for name in code.co_names:
+                value = globals().get(name)
+                if (inspect.isfunction(value) or inspect.isclass(value)) and value.__module__ == __name__:
+                    stack.append(value)
+    return [sources[name] for name in sorted(sources)]
+
+# The code genGlyphOutlines reaches and the whole of clsvg, editing the rest of the build keeps the cached glyphs
+def strokeCodeHash(strokeWidth=STROKE_WIDTH, styles=None, removeOverlaps=False):
+    global OUTLINE_SOURCES
+    if OUTLINE_SOURCES is None:
+        OUTLINE_SOURCES = reachedSources([genGlyphOutlines])
+    clsvgDir = os.path.dirname(os.path.abspath(bs.__file__))
+    files = sorted(os.path.join(clsvgDir, f) for f in os.listdir(clsvgDir) if f.endswith('.py'))
+    versions = []
+    if removeOverlaps:
+        import pathops
+        versions.append(pathops.__version__)
+    return hashJson([FONT_SIZE, strokeWidth, GLYPFH_WIDTH, CHAR_WIDTH, styles or STROKE_STYLES, OUTLINE_SOURCES, sourceHash(files), versions])
+
+def glyphHash(attrs, codeHash):
+    return hashJson([codeHash, attrs['comb']['key_paths'], attrs['info']['scale']])
+
+# Writes are committed every OUTLINE_CACHE_BATCH puts in WAL mode, so other processes can read and
+# write the cache during a build, and an interrupted build keeps what it computed
+class OutlineCache:
+    def __init__(self, file=OUTLINE_CACHE_FILE, maxSize=OUTLINE_CACHE_SIZE, batch=OUTLINE_CACHE_BATCH):
+        self.maxSize = maxSize
+        self.batch = batch
+        self.conn = sqlite3.connect(file, timeout=OUTLINE_CACHE_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS outlines (key TEXT PRIMARY KEY, data BLOB, error TEXT, size INTEGER, used INTEGER)')
+        self.conn.commit()
+        self.tick = self.conn.execute('SELECT COALESCE(MAX(used), 0) FROM outlines').fetchone()[0]
+        self.used = {}
+        self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key):
+        return self.conn.execute('SELECT 1 FROM outlines WHERE key = ?', (key,)).fetchone() is not None
+
+    def get(self, key):
+        row = self.conn.execute('SELECT data, error FROM outlines WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        # Use times are written with the next batch
+        self.tick += 1
+        self.used[key] = self.tick
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def put(self, key, contours, error):
+        data = zlib.compress(json.dumps(contours, separators=(',', ':')).encode('utf-8'))
+        self.tick += 1
+        self.used.pop(key, None)
+        self.conn.execute('INSERT OR REPLACE INTO outlines VALUES (?, ?, ?, ?, ?)', (key, data, error, len(data), self.tick))
+        self.pending += 1
+        if self.pending >= self.batch:
+            self.commit()
+
+    def commit(self):
+        if self.used:
+            self.conn.executemany('UPDATE outlines SET used = ? WHERE key = ?', [(used, key) for key, used in self.used.items()])
+            self.used = {}
+        self.conn.commit()
+        self.pending = 0
+
+    def evict(self):
+        # Drop the least recently used outlines until the cache fits in maxSize
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM outlines').fetchone()[0]
+        if total <= self.maxSize:
+            return
+        rows = self.conn.execute('SELECT key, size FROM outlines ORDER BY used').fetchall()
+        drop = []
+        for key, size in rows:
+            if total <= self.maxSize:
+                break
+            drop.append((key,))
+            total -= size
+        self.conn.executemany('DELETE FROM outlines WHERE key = ?', drop)
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            self.commit()
+            self.evict()
+            self.conn.commit()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+# Yields (name, [(contours, error) per weight], hit), a glyph is only reused when every weight is cached
+def genCachedOutlines(items, cache, jobs=1, offset=GLYPH_OFFSET, reuse=True, weights=DEFAULT_WEIGHTS, removeOverlaps=False):
+    codeHashes = [strokeCodeHash(strokeWidth, styles, removeOverlaps) for _, strokeWidth, styles in weights]
+    items = [(name, attrs, [hashJson([glyphHash(attrs, codeHash), offset, removeOverlaps]) for codeHash in codeHashes]) for name, attrs in items]
+    hits = set(name for name, _, keys in items if reuse and all(key in cache for key in keys))
+    outlines = genOutlines([(name, attrs) for name, attrs, _ in items if name not in hits], jobs, offset, weights, removeOverlaps)
+
+    for name, attrs, keys in items:
+        if name in hits:
+            with profileStage('cache', name):
+                results = [cache.get(key) for key in keys]
+        else:
+            results = []
+            for key, (contours, error) in zip(keys, next(outlines)[1]):
+                if isinstance(error, GlyphWorkerError):
+                    results.append((contours, str(error)))
+                    continue
+                if error is not None:
+                    error = str(error)
+                cache.put(key, contours, error)
+                results.append((contours, error))
+        yield name, results, name in hits
+
+def drawContours(glyph, contours, ascent):
+    # fontforge's y axis points up from the baseline, svg's points down from the top
+    pen = glyph.glyphPen()
+    for start, segments in contours:
+        pen.moveTo((start[0], ascent - start[1]))
+        for seg in segments:
+            if len(seg) == 2:
+                pen.lineTo((seg[0], ascent - seg[1]))
+            else:
+                pen.curveTo((seg[0], ascent - seg[1]), (seg[2], ascent - seg[3]), (seg[4], ascent - seg[5]))
+        pen.closePath()
+    pen = None
+
+SVG_PATH_TOKEN = re.compile(r'([MmLlHhVvCcSsZz])|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+SVG_PATH_ARGS = { 'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Z': 0 }
+
+# Path data of the symbols (M L H V C S Z, absolute and relative) into contours
+def parseSvgPath(d, origin=(0, 0)):
+    tokens = deque((cmd, float(num) if num else None) for cmd, num in SVG_PATH_TOKEN.findall(d))
+    contours = []
+    current = None
+    x = y = startX = startY = 0.0
+    lastCtrl = None
+    cmd = None
+    def point(px, py):
+        return (round(px - origin[0], 3), round(py - origin[1], 3))
+
+    while tokens:
+        if tokens[0][0]:
+            cmd = tokens.popleft()[0]
+        elif cmd is None:
+            raise ValueError('path data does not start with a command')
+        op = cmd.upper()
+        rel = cmd != op
+        args = [tokens.popleft()[1] for i in range(SVG_PATH_ARGS[op])]
+        if None in args:
+            raise ValueError('missing arguments of %s' % cmd)
+        if rel and op != 'Z':
+            args = [v + (y if (op == 'V' or (op != 'H' and i % 2)) else x) for i, v in enumerate(args)]
+
+        if op == 'M':
+            x, y = startX, startY = args
+            current = (point(x, y), [])
+            contours.append(current)
+            # Coordinates following a moveto are implicit linetos
+            cmd = 'l' if rel else 'L'
+            lastCtrl = None
+        elif op == 'Z':
+            if current is not None and current[1] and current[1][-1] == current[0]:
+                current[1].pop()
+            x, y = startX, startY
+            current = None
+            lastCtrl = None
+        else:
+            if current is None:
+                current = (point(x, y), [])
+                contours.append(current)
+            if op in 'LHV':
+                if op == 'L':
+                    x, y = args
+                elif op == 'H':
+                    x = args[0]
+                else:
+                    y = args[0]
+                end = point(x, y)
+                if end != (current[1][-1][-2:] if current[1] else current[0]):
+                    current[1].append(end)
+                lastCtrl = None
+            else:
+                if op == 'C':
+                    x1, y1, x2, y2, nx, ny = args
+                else:
+                    # The first control point mirrors the last one of the previous curve
+                    x1, y1 = (2*x - lastCtrl[0], 2*y - lastCtrl[1]) if lastCtrl else (x, y)
+                    x2, y2, nx, ny = args
+                current[1].append(point(x1, y1) + point(x2, y2) + point(nx, ny))
+                lastCtrl = (x2, y2)
+                x, y = nx, ny
+    return [contour for contour in contours if contour[1]]
+
+def parseSymbol(filePath):
+    root = svgfile.parse(filePath).getroot()
+    minX, minY, width, height = (float(v) for v in root.attrib['viewBox'].replace(',', ' ').split())
+    contours = []
+    for elem in root.iter():
+        if elem.tag.rsplit('}', 1)[-1] == 'path' and elem.get('d'):
+            contours.extend(parseSvgPath(elem.get('d'), (minX, minY)))
+    return int(width), contours
+
+def symbolCodeHash():
+    return hashJson([inspect.getsource(f) for f in (parseSvgPath, parseSymbol)])
+
+# Parsed symbols live in a zlib compressed json keyed by file name. A file is only read again
+# when its mtime or size changes, and only parsed again when its content hash changes too.
+def loadSymbols(removeOverlaps=False, symbolsDir=SYMBOLS_DIR, cacheFile=SYMBOL_CACHE_FILE, chars=None):
+    codeHash = symbolCodeHash()
+    entries = {}
+    if os.path.exists(cacheFile):
+        try:
+            with open(cacheFile, 'rb') as f:
+                cached = json.loads(zlib.decompress(f.read()))
+            if cached['code'] == codeHash:
+                entries = cached['symbols']
+        except (ValueError, KeyError, zlib.error):
+            pass
+
+    symbols = {}
+    newEntries = {}
+    changed = len(entries) == 0
+    for filename in sorted(os.listdir(symbolsDir)):
+        if filename[-4:] != '.svg' or not filename[:-4].isdecimal():
+            continue
+        if chars is not None and chr(int(filename[:-4])) not in chars:
+            # Not needed by a subset build, the cache keeps what it knows about it
+            if filename in entries:
+                newEntries[filename] = entries[filename]
+            continue
+        filePath = os.path.join(symbolsDir, filename)
+        stat = os.stat(filePath)
+        entry = entries.get(filename)
+        if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            with open(filePath, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            if entry is None or entry['hash'] != digest:
+                width, contours = parseSymbol(filePath)
+                entry = { 'hash': digest, 'width': width, 'contours': contours }
+            entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+            changed = True
+        if removeOverlaps and 'clean' not in entry:
+            entry['clean'] = removeContourOverlaps(entry['contours']) if entry['contours'] else []
+            changed = True
+        newEntries[filename] = entry
+        contours = entry['clean'] if removeOverlaps else entry['contours']
+        symbols[chr(int(filename[:-4]))] = (entry['width'], [(tuple(start), [tuple(seg) for seg in segments]) for start, segments in contours])
+
+    if changed or len(newEntries) != len(entries):
+        data = json.dumps({ 'code': codeHash, 'symbols': newEntries }, separators=(',', ':')).encode('utf-8')
+        writeAtomic(cacheFile, zlib.compress(data))
+    return symbols
+
+def testChar(char, dataFile=DATA_FILE):
+    with profileStage('load'):
+        data = loadStrucData(dataFile)
+    with OutlineCache() as cache:
+        for _, results, _ in genCachedOutlines([(char, data[char])], cache, 1, TEST_GLYPH_OFFSET):
+            contours, error = results[0]
+            if error is not None:
+                print(char, error)
+
+            writeTempGlyphFromContours(contours, TEMP_GLYPH_FILE, 'svg', GLYPH_ATTRIB)
+
+def testAllChar(jobs=1, dataFile=DATA_FILE):
     if not os.path.exists(TEST_GLYPHS_DIR):
         os.mkdir(TEST_GLYPHS_DIR)
     else:
@@ -1745,145 +3052,584 @@ def testAllChar():
             if os.path.isfile(file_path):
                 os.remove(file_path)
 
-    data = loadJson(DATA_FILE)
-    for char, kpath in data.items():
-        scale, p_map, bpaths = getCharData(kpath, FONT_SIZE)
-        view = getStrucView(bpaths, p_map)
-
-        shapes = []
-        for i, bpath in enumerate(bpaths):
-            shape = bs.BezierShape()
-            shape.extend(toStrokes(bpath, STROKE_WIDTH, p_map, view, scale, i, bpaths))
-            shape.transform(move=bs.Point(FONT_SIZE * (1-GLYPFH_WIDTH) / 2))
-            shapes.append(shape)
+    with profileStage('load'):
+        data = loadStrucData(dataFile)
+    with OutlineCache() as cache:
+        for char, results, _ in genCachedOutlines(data.items(), cache, jobs, TEST_GLYPH_OFFSET):
+            contours, error = results[0]
+            if error is not None:
+                print(char, error)
 
-        writeTempGlyphFromShapes(shapes, os.path.join(TEST_GLYPHS_DIR, '%s.svg' % char), 'svg', GLYPH_ATTRIB)
+            with profileStage('write', char):
+                writeTempGlyphFromContours(contours, os.path.join(TEST_GLYPHS_DIR, '%s.svg' % char), 'svg', GLYPH_ATTRIB)
 
-def corrections(list):
+def corrections(list, dataFile=DATA_FILE):
     import fontforge
     font = fontforge.open("YuFanXiLiu.sfd")
 
     num = len(list)
     count = 0
-    data = loadJson(DATA_FILE)
-    for name in list:
-        attrs = data[name]
-
-        char = name
-        code = ord(char)
-        if code < 128:
-            width = int(CHAR_WIDTH / 2)
-        else:
-            width = CHAR_WIDTH
+    with profileStage('load'):
+        data = loadStrucData(dataFile)
+    removeOverlaps = overlapRemoval()
+    with OutlineCache() as cache:
+        for name, results, _ in genCachedOutlines([(name, data[name]) for name in list], cache, removeOverlaps=removeOverlaps):
+            contours, error = results[0]
+            char = name
+            code = ord(char)
+            if code < 128:
+                width = int(CHAR_WIDTH / 2)
+            else:
+                width = CHAR_WIDTH
         
-        scale, p_map, bpaths = getCharData(attrs, FONT_SIZE)
-        view = getStrucView(bpaths, p_map)
-        shapes = []
-        for bpath in bpaths:
-            shape = bs.BezierShape()
-            shape.extend(toStrokes(bpath, STROKE_WIDTH, p_map, view, scale, bpaths))
-            shape.transform(move=bs.Point((CHAR_WIDTH - FONT_SIZE * GLYPFH_WIDTH) / 2))
-            shapes.append(shape)
-            
-        writeTempGlyphFromShapes(shapes, TEMP_GLYPH_FILE, 'svg', GLYPH_ATTRIB)
-        glyph = font.createChar(code)
-        glyph.clear()
-        glyph.importOutlines(TEMP_GLYPH_FILE)
-        glyph.width = width
-        glyph.removeOverlap()
+            if error is not None:
+                print(char, error)
+
+            glyph = font.createChar(code)
+            glyph.clear()
+            drawContours(glyph, contours, font.ascent)
+            glyph.width = width
+            if not removeOverlaps:
+                glyph.removeOverlap()
         
-        count += 1
-        print("(%d/%d)%s: import glyph '%s' %d" % (count, num, font.fontname, char, code))            
-    
+            count += 1
+            print("(%d/%d)%s: import glyph '%s' %d" % (count, num, font.fontname, char, code))            
+
     # font.generate(font.fontname + ".otf")
     font.generate(font.fontname + ".ttf")
     font.save(font.fontname + ".sfd")
     font.close()
 
-    os.remove(TEMP_GLYPH_FILE)
-
-def importGlyphs():
+def loadSfdInfo(file=SFD_FILE):
+    info = {}
+    with open(file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('BeginChars:'):
+                break
+            key, sep, value = line.partition(': ')
+            if sep and key not in info:
+                info[key] = value.strip()
+    return info
+
+def glyphName(char):
+    code = ord(char)
+    return 'uni%04X' % code if code <= 0xFFFF else 'u%05X' % code
+
+def glyphAdvance(char):
+    return int(CHAR_WIDTH / 2) if ord(char) < 128 else CHAR_WIDTH
+
+def writeAtomic(fileName, data):
+    # A file that exists is complete, which is what resuming relies on
+    tempName = fileName + '.tmp'
+    with open(tempName, 'wb') as f:
+        f.write(data)
+    os.replace(tempName, fileName)
+
+# Writers log every glyph with its hash, an interrupted export picks up where it stopped
+class GlyphWriter:
+    def openLog(self, resume):
+        self.done = {}
+        if resume and os.path.exists(self.logFile):
+            with open(self.logFile, 'r+b') as f:
+                end = 0
+                for line in f:
+                    try:
+                        char, key = json.loads(line)
+                    except ValueError:
+                        break
+                    self.done[char] = key
+                    end += len(line)
+                # Drop a last line cut short by an interruption before appending to it
+                f.truncate(end)
+        elif not resume:
+            self.clear()
+        self.log = open(self.logFile, 'a' if resume else 'w', encoding='utf-8')
+
+    def isDone(self, char, key):
+        return self.done.get(char) == key and os.path.exists(self.path(char))
+
+    def add(self, char, contours, key, width=None):
+        self.write(char, contours, width)
+        self.log.write(json.dumps([char, key], ensure_ascii=False) + '\n')
+        self.log.flush()
+        self.done[char] = key
+
+    def close(self, chars):
+        self.log.close()
+        self.finish([char for char in self.done if char in chars])
+
+class SvgGlyphWriter(GlyphWriter):
+    offset = TEST_GLYPH_OFFSET
+
+    def __init__(self, outDir):
+        self.dir = outDir
+        self.logFile = os.path.join(outDir, EXPORT_LOG_FILE)
+        os.makedirs(outDir, exist_ok=True)
+
+    def path(self, char):
+        return os.path.join(self.dir, '%s.svg' % char)
+
+    def clear(self):
+        for f in os.listdir(self.dir):
+            if f.endswith('.svg'):
+                os.remove(os.path.join(self.dir, f))
+
+    def write(self, char, contours, width=None):
+        newRoot = newGlyphRoot('svg', GLYPH_ATTRIB)
+        if len(contours):
+            newRoot.append(svgfile.ET.Element('path', { 'class': 'st0', 'd': contoursToSvgPath(contours) }))
+        writeAtomic(self.path(char), svgfile.ET.tostring(newRoot, encoding='utf-8', xml_declaration=True))
+
+    def finish(self, chars):
+        pass
+
+# Minimal UFO 3 font: metadata from the sfd header and one glif per glyph
+class UfoGlyphWriter(GlyphWriter):
+    offset = GLYPH_OFFSET
+
+    def __init__(self, ufoDir, info, weightName=None):
+        self.dir = ufoDir
+        self.glyphsDir = os.path.join(ufoDir, 'glyphs')
+        self.logFile = os.path.join(ufoDir, 'data', EXPORT_LOG_FILE)
+        self.info = info
+        self.weightName = weightName
+        self.ascent = int(info['Ascent'])
+        os.makedirs(self.glyphsDir, exist_ok=True)
+        os.makedirs(os.path.dirname(self.logFile), exist_ok=True)
+
+    @staticmethod
+    def fileName(name):
+        # The UFO user name to file name rule: upper case letters get a trailing underscore
+        return ''.join(c + '_' if c.isupper() else c for c in name) + '.glif'
+
+    def path(self, char):
+        return os.path.join(self.glyphsDir, self.fileName(glyphName(char)))
+
+    def clear(self):
+        for f in os.listdir(self.glyphsDir):
+            if f.endswith('.glif'):
+                os.remove(os.path.join(self.glyphsDir, f))
+
+    def write(self, char, contours, width=None):
+        ET = svgfile.ET
+        root = ET.Element('glyph', { 'name': glyphName(char), 'format': '2' })
+        ET.SubElement(root, 'advance', { 'width': str(width if width is not None else glyphAdvance(char)) })
+        ET.SubElement(root, 'unicode', { 'hex': '%04X' % ord(char) })
+        outline = ET.SubElement(root, 'outline')
+        for start, segments in contours:
+            contour = ET.SubElement(outline, 'contour')
+            def point(x, y, type=None):
+                attrib = { 'x': '%g' % x, 'y': '%g' % (self.ascent - y) }
+                if type:
+                    attrib['type'] = type
+                ET.SubElement(contour, 'point', attrib)
+            # Each on-curve point closes the segment coming from the previous one
+            for seg in segments:
+                if len(seg) == 2:
+                    point(seg[0], seg[1], 'line')
+                else:
+                    point(seg[0], seg[1])
+                    point(seg[2], seg[3])
+                    point(seg[4], seg[5], 'curve')
+            if not segments or tuple(segments[-1][-2:]) != tuple(start):
+                point(start[0], start[1], 'line')
+        writeAtomic(self.path(char), ET.tostring(root, encoding='utf-8', xml_declaration=True))
+
+    def finish(self, chars):
+        info = self.info
+        styleName = self.weightName or info.get('Weight', 'Regular')
+        fontName = '%s-%s' % (info['FontName'], self.weightName) if self.weightName else info['FontName']
+        major, minor = FONT_VARSION.split('.')
+        fontInfo = {
+            'familyName': info['FamilyName'],
+            'styleName': styleName,
+            'postscriptFontName': fontName,
+            'copyright': info.get('Copyright', ''),
+            'versionMajor': int(major),
+            'versionMinor': int(minor),
+            'unitsPerEm': self.ascent + int(info['Descent']),
+            'ascender': self.ascent,
+            'descender': -int(info['Descent']),
+        }
+        names = sorted((glyphName(char), self.fileName(glyphName(char))) for char in chars)
+        with open(os.path.join(self.dir, 'metainfo.plist'), 'wb') as f:
+            plistlib.dump({ 'creator': 'genFont', 'formatVersion': 3 }, f)
+        with open(os.path.join(self.dir, 'fontinfo.plist'), 'wb') as f:
+            plistlib.dump(fontInfo, f)
+        with open(os.path.join(self.dir, 'layercontents.plist'), 'wb') as f:
+            plistlib.dump([['public.default', 'glyphs']], f)
+        with open(os.path.join(self.glyphsDir, 'contents.plist'), 'wb') as f:
+            plistlib.dump(dict(names), f)
+        with open(os.path.join(self.dir, 'lib.plist'), 'wb') as f:
+            plistlib.dump({ 'public.glyphOrder': [name for name, _ in names] }, f)
+
+def exportWriters(outDir, fmt, weights):
+    if fmt == 'ufo':
+        info = loadSfdInfo()
+        if len(weights) == 1 and weights[0][0] is None:
+            return [UfoGlyphWriter(outDir, info)]
+        return [UfoGlyphWriter(os.path.join(outDir, '%s-%s.ufo' % (info['FontName'], weightName)), info, weightName) for weightName, _, _ in weights]
+    if len(weights) == 1 and weights[0][0] is None:
+        return [SvgGlyphWriter(outDir)]
+    return [SvgGlyphWriter(os.path.join(outDir, weightName)) for weightName, _, _ in weights]
+
+# Streams loader -> outlines -> writers one glyph at a time, so memory stays flat
+def exportGlyphs(outDir, fmt='svg', jobs=1, dataFile=DATA_FILE, resume=True, weights=DEFAULT_WEIGHTS, chars=None):
+    writers = exportWriters(outDir, fmt, weights)
+    offset = writers[0].offset
+    # UFOs are handed to other compilers, give them clean outlines; svg previews keep the strokes
+    removeOverlaps = fmt == 'ufo' and hasPathops()
+    if fmt == 'ufo' and not removeOverlaps:
+        print("skia-pathops is not installed, overlaps are kept")
+    codeHashes = [strokeCodeHash(strokeWidth, styles, removeOverlaps) for _, strokeWidth, styles in weights]
+    for writer in writers:
+        writer.openLog(resume)
+
+    with profileStage('load'):
+        data = loadStrucData(dataFile, chars)
+    # A font needs the symbols too, they replace generated glyphs of the same char like in importGlyphs
+    with profileStage('symbols'):
+        symbols = loadSymbols(removeOverlaps, chars=chars) if fmt == 'ufo' else {}
+    if chars is not None:
+        subsetReport(chars, data, symbols)
+        jobs = min(jobs or os.cpu_count(), max(len(data), 1))
+    pendingKeys = deque()
+    counts = { 'written': 0, 'skipped': 0, 'errors': 0 }
+    def pending():
+        for char in data:
+            if char in symbols:
+                continue
+            attrs = data[char]
+            keys = [hashJson([glyphHash(attrs, codeHash), offset, removeOverlaps]) for codeHash in codeHashes]
+            if all(writer.isDone(char, key) for writer, key in zip(writers, keys)):
+                counts['skipped'] += 1
+                continue
+            pendingKeys.append(keys)
+            yield char, attrs
+
+    for char, results in genOutlines(pending(), jobs, offset, weights, removeOverlaps):
+        keys = pendingKeys.popleft()
+        for writer, key, (contours, error) in zip(writers, keys, results):
+            if error is not None:
+                counts['errors'] += 1
+                print(char, error)
+                if isinstance(error, GlyphWorkerError):
+                    # Left out of the log so resuming retries it
+                    continue
+            if removeOverlaps:
+                # UFO outlines follow the PostScript direction
+                contours = reverseContours(contours)
+            with profileStage('write', char):
+                writer.add(char, contours, key)
+        counts['written'] += 1
+        if counts['written'] % 100 == 0:
+            print("export: %d glyphs written, %d already up to date" % (counts['written'], counts['skipped']))
+
+    for char, (width, contours) in symbols.items():
+        key = hashJson([width, contours])
+        if removeOverlaps:
+            contours = reverseContours(contours)
+        for writer in writers:
+            if writer.isDone(char, key):
+                continue
+            with profileStage('write', char):
+                writer.add(char, contours, key, width)
+
+    chars = set(data) | set(symbols)
+    with profileStage('generate'):
+        for writer in writers:
+            writer.close(chars)
+    print("export to %s: %d glyphs written, %d already up to date, %d errors" % (outDir, counts['written'], counts['skipped'], counts['errors']))
+
+# Packs one glyph in font coordinates into a charstring or glyf glyph
+def compileGlyph(item, fmt='otf'):
+    name, width, contours = item
+    if fmt == 'otf':
+        from fontTools.pens.t2CharStringPen import T2CharStringPen
+        from fontTools.pens.reverseContourPen import ReverseContourPen
+        pen = T2CharStringPen(width, None)
+        # cff wants counter-clockwise outer contours, the opposite of glyf
+        drawContoursToPen(ReverseContourPen(pen), contours)
+        return name, width, pen.getCharString().program
+    else:
+        from fontTools.pens.ttGlyphPen import TTGlyphPen
+        from fontTools.pens.cu2quPen import Cu2QuPen
+        pen = TTGlyphPen(None)
+        drawContoursToPen(Cu2QuPen(pen, 1.0), contours)
+        return name, width, pen.glyph()
+
+def symbolGlyphs(ascent, removeOverlaps=False, chars=None):
+    return { char: (width, flipContours(contours, ascent)) for char, (width, contours) in loadSymbols(removeOverlaps, chars=chars).items() }
+
+def compileGlyphs(items, jobs, fmt):
+    worker = partial(compileGlyph, fmt=fmt)
+    if jobs == 1:
+        return [worker(item) for item in items]
+    with multiprocessing.Pool(jobs) as pool:
+        return pool.map(worker, items, chunksize=32)
+
+def saveFontTools(fileName, info, weightName, glyphs, cmap, fmt):
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.misc.psCharStrings import T2CharString
+    ascent = int(info['Ascent'])
+    descent = int(info['Descent'])
+    lineGap = int(info.get('LineGap', 0))
+    styleName = weightName or info.get('Weight', 'Regular')
+    psName = '%s-%s' % (info['FontName'], weightName) if weightName else info['FontName']
+    fullName = '%s %s' % (info['FullName'], weightName) if weightName else info['FullName']
+
+    fb = FontBuilder(ascent + descent, isTTF=(fmt == 'ttf'))
+    fb.setupGlyphOrder(list(glyphs))
+    fb.setupCharacterMap(cmap)
+    if fmt == 'ttf':
+        fb.setupGlyf({ name: glyph for name, (_, glyph) in glyphs.items() })
+    else:
+        fb.setupCFF(psName, { 'FullName': fullName, 'FamilyName': info['FamilyName'], 'Weight': styleName }, { name: T2CharString(program=program) for name, (_, program) in glyphs.items() }, {})
+    if fmt == 'ttf':
+        glyf = fb.font['glyf']
+        lsb = { name: getattr(glyf[name], 'xMin', 0) for name in glyphs }
+    else:
+        charStrings = fb.font['CFF '].cff.topDictIndex[0].CharStrings
+        lsb = {}
+        for name in glyphs:
+            bounds = charStrings[name].calcBounds(charStrings)
+            lsb[name] = math.floor(bounds[0]) if bounds else 0
+    fb.setupHorizontalMetrics({ name: (width, lsb[name]) for name, (width, _) in glyphs.items() })
+    fb.setupHorizontalHeader(ascent=ascent, descent=-descent, lineGap=lineGap)
+    fb.setupNameTable({
+        'copyright': info.get('Copyright', ''),
+        'familyName': info['FamilyName'],
+        'styleName': styleName,
+        'fullName': fullName,
+        'psName': psName,
+        'version': 'Version %s' % FONT_VARSION,
+    })
+    fb.setupOS2(sTypoAscender=ascent, sTypoDescender=-descent, sTypoLineGap=lineGap, usWinAscent=ascent, usWinDescent=descent,
+        usWeightClass=int(info.get('TTFWeight', 400)), fsType=int(info.get('FSType', 0)), achVendID=info.get('OS2Vendor', "'PfEd'").strip("'"))
+    fb.setupPost()
+    fb.font['head'].fontRevision = float(FONT_VARSION)
+    fb.save(fileName)
+
+# fontTools backend: same outlines as importGlyphs, compiled without fontforge
+def buildFontTools(jobs=1, incremental=True, dataFile=DATA_FILE, weights=DEFAULT_WEIGHTS, fmt='otf', chars=None):
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count()
+    info = loadSfdInfo()
+    ascent = int(info['Ascent'])
+    removeOverlaps = hasPathops()
+    if not removeOverlaps:
+        print("skia-pathops is not installed, overlaps are kept")
+
+    with profileStage('load'):
+        data = loadStrucData(dataFile, chars)
+    if chars is not None:
+        jobs = min(jobs, max(len(data), 1))
+    items = [[] for weight in weights]
+    errorLists = [{} for weight in weights]
+    cmap = {}
+    with OutlineCache() as cache:
+        for char, results, _ in genCachedOutlines(((name, data[name]) for name in data), cache, jobs, reuse=incremental, weights=weights, removeOverlaps=removeOverlaps):
+            name = glyphName(char)
+            cmap[ord(char)] = name
+            for weightItems, errorList, (contours, error) in zip(items, errorLists, results):
+                if error is not None:
+                    errorList[char] = error
+                weightItems.append((name, glyphAdvance(char), flipContours(contours, ascent)))
+
+    symbols = []
+    with profileStage('symbols'):
+        table = symbolGlyphs(ascent, removeOverlaps, chars)
+        for char, (width, contours) in table.items():
+            cmap[ord(char)] = glyphName(char)
+            symbols.append((glyphName(char), width, contours))
+    if chars is not None:
+        subsetReport(chars, data, table)
+    with profileStage('compile'):
+        symbols = compileGlyphs(symbols, jobs, fmt)
+    cmap[32] = 'space' #空格
+
+    for (weightName, _, _), weightItems, errorList in zip(weights, items, errorLists):
+        glyphs = {}
+        with profileStage('compile'):
+            compiled = compileGlyphs(weightItems, jobs, fmt)
+        for name, width, glyph in [compileGlyph(('.notdef', int(FONT_SIZE/2), []), fmt), compileGlyph(('space', int(FONT_SIZE/2), []), fmt)] + compiled + symbols:
+            glyphs[name] = (width, glyph)
+
+        fileName = '%s-%s' % (info['FontName'], weightName) if weightName else info['FontName']
+        if chars is not None:
+            fileName = '%s.%s' % (fileName, SUBSET_NAME)
+        fileName = '%s.%s' % (fileName, fmt)
+        with profileStage('generate'):
+            saveFontTools(fileName, info, weightName, glyphs, cmap, fmt)
+        if len(errorList):
+            print("\n%d glyphs with errors!" % len(errorList))
+            for char, e in errorList.items():
+                print(char, e)
+        print("\n%s: The Font has %d glyphs" % (fileName, len(glyphs) - len(errorList)))
+
+def openWeightFont(weightName):
     import fontforge
     font = fontforge.open("config.sfd")
     font.version = FONT_VARSION
     font.createChar(32).width = int(FONT_SIZE/2) #空格
-
-    data = loadJson(DATA_FILE)
-    errorList = {}
-    num = len(data)
-    count = 0
-    
-    for name, attrs in reversed(data.items()):
-        char = name
+    if weightName:
+        font.fontname = '%s-%s' % (font.fontname, weightName)
+        font.fullname = '%s %s' % (font.fullname, weightName)
+        font.weight = weightName
+    return font
+
+def importSymbols(font, errorList, symbols):
+    num = len(symbols)
+    symCount = 0
+    for char, (width, contours) in symbols.items():
         code = ord(char)
-        if code < 128:
-            width = int(CHAR_WIDTH / 2)
-        else:
-            width = CHAR_WIDTH
-        
-        count += 1
-        print("(%d/%d)%s: import glyph '%s' %d" % (count, num, font.fontname, char, code))
-        
-        scale, p_map, bpaths = getCharData(attrs, FONT_SIZE)
-        view = getStrucView(bpaths, p_map)
-        shapes = []
+        symCount += 1
+        print("(%d/%d)%s: import symbol glyph '%s' %d" % (symCount, num, font.fontname, char, code))
+
         try:
-            for i, bpath in enumerate(bpaths):
-                shape = bs.BezierShape()
-                shape.extend(toStrokes(bpath, STROKE_WIDTH, p_map, view, scale, i, bpaths))
-                shape.transform(move=bs.Point((CHAR_WIDTH - FONT_SIZE * GLYPFH_WIDTH) / 2))
-                shapes.append(shape)
+            with profileStage('import', char):
+                glyph = font.createChar(code)
+                glyph.clear()
+                drawContours(glyph, contours, font.ascent)
+                glyph.width = width
         except Exception as e:
             errorList[char] = e
             print(char, e)
+    return symCount
+
+def importGlyphs(jobs=1, incremental=True, dataFile=DATA_FILE, weights=DEFAULT_WEIGHTS, chars=None):
+    fonts = [openWeightFont(weightName) for weightName, _, _ in weights]
+    errorLists = [{} for font in fonts]
+    fontNames = ', '.join(font.fontname for font in fonts)
+
+    with profileStage('load'):
+        data = loadStrucData(dataFile, chars)
+    num = len(data)
+    if chars is not None:
+        jobs = min(jobs or os.cpu_count(), max(num, 1))
+    count = 0
+    reuseCount = 0
+
+    # Overlaps removed per glyph by the outline workers are cached with the outlines
+    removeOverlaps = overlapRemoval()
+    with OutlineCache() as cache:
+        for name, results, reuse in genCachedOutlines(((name, data[name]) for name in reversed(list(data))), cache, jobs, reuse=incremental, weights=weights, removeOverlaps=removeOverlaps):
+            char = name
+            code = ord(char)
+            if code < 128:
+                width = int(CHAR_WIDTH / 2)
+            else:
+                width = CHAR_WIDTH
         
-        writeTempGlyphFromShapes(shapes, TEMP_GLYPH_FILE, 'svg', GLYPH_ATTRIB)
-        glyph = font.createChar(code)
-        glyph.importOutlines(TEMP_GLYPH_FILE)
-        glyph.width = width
-        
-    fileList = os.listdir(SYMBOLS_DIR)
-    num = len(fileList)
-    symCount = 0
-    for filename in fileList:
-        filePath = '%s/%s' % (SYMBOLS_DIR, filename)
-        if(filename[-4:] == '.svg'):
-            if(filename[:-4].isdecimal()):
-                n = int(filename[:-4])
-                char = chr(n)
-                code = n
-                width = int(float(svgfile.parse(filePath).getroot().attrib['viewBox'].split()[2]))
+            count += 1
+            if reuse:
+                reuseCount += 1
             else:
-                continue
-
-            symCount += 1
-            print("(%d/%d)%s: import symbol glyph '%s' %d from %s" % (symCount, num, font.fontname, char, code, filename))
+                print("(%d/%d)%s: import glyph '%s' %d" % (count, num, fontNames, char, code))
+        
+            for font, errorList, (contours, error) in zip(fonts, errorLists, results):
+                if error is not None:
+                    errorList[char] = error
+                    print(font.fontname, char, error)
             
-            try:
-                glyph = font.createChar(code)
-                glyph.importOutlines(filePath)
-                glyph.width = width
-            except Exception as e:
-                errorList[filename] = e
-                print(filename, e)
-
-    if len(errorList):
-        print("\n%d glyphs with errors!" % len(errorList))
-        for name, e in errorList.items():
-            print(name, e)
-
-    font.selection.all()
-    font.removeOverlap()
-    
-    print("\n%s: The Font has %d glyphs" % (font.fontname, count + symCount - len(errorList)))
-    print("Generate font file in %s\n" % (font.fontname + ".otf"))
-    
-    font.generate(font.fontname + ".otf")
-    # font.generate(font.fontname + ".ttf")
-    font.save(font.fontname + ".sfd")
-    font.close()
-
-    os.remove(TEMP_GLYPH_FILE)
+                with profileStage('import', char):
+                    glyph = font.createChar(code)
+                    drawContours(glyph, contours, font.ascent)
+                    glyph.width = width
+
+    print("\n%d glyphs regenerated, %d reused from %s" % (count - reuseCount, reuseCount, OUTLINE_CACHE_FILE))
+
+    with profileStage('symbols'):
+        symbols = loadSymbols(removeOverlaps, chars=chars)
+    if chars is not None:
+        subsetReport(chars, data, symbols)
+    for font, errorList in zip(fonts, errorLists):
+        symCount = importSymbols(font, errorList, symbols)
+
+        if len(errorList):
+            print("\n%s: %d glyphs with errors!" % (font.fontname, len(errorList)))
+            for name, e in errorList.items():
+                print(name, e)
+
+        if not removeOverlaps:
+            with profileStage('removeOverlap'):
+                font.selection.all()
+                font.removeOverlap()
+        
+        fileName = font.fontname if chars is None else '%s.%s' % (font.fontname, SUBSET_NAME)
+        print("\n%s: The Font has %d glyphs" % (font.fontname, count + symCount - len(errorList)))
+        print("Generate font file in %s\n" % (fileName + ".otf"))
+        
+        with profileStage('generate'):
+            font.generate(fileName + ".otf")
+            # font.generate(fileName + ".ttf")
+            font.save(fileName + ".sfd")
+        font.close()
 
 if __name__ == '__main__':
-    importGlyphs()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of processes computing glyph outlines')
+    parser.add_argument('--full', action='store_true', help='regenerate every glyph instead of reusing cached outlines')
+    parser.add_argument('--data', default=DATA_FILE, help='struc_data file, json or compiled')
+    parser.add_argument('--compile-data', metavar='FILE', nargs='?', const=DATA_BIN_FILE, help='compile the json struc_data into the binary format and exit')
+    parser.add_argument('--style', metavar='FILE', help='json file overriding stroke style tables')
+    parser.add_argument('--export', metavar='DIR', help='stream the glyphs to DIR instead of building the font, no fontforge needed')
+    parser.add_argument('--format', choices=['svg', 'ufo'], default='svg', help='format used by --export')
+    parser.add_argument('--restart', action='store_true', help='start --export from scratch instead of resuming')
+    parser.add_argument('--backend', choices=['fontforge', 'fonttools'], default='fontforge', help='library compiling the font file')
+    parser.add_argument('--overlaps', choices=['auto', 'pathops', 'fontforge'], default=OVERLAP_REMOVAL, help='how the fontforge backend removes overlaps: per glyph with skia-pathops, or by fontforge over the whole font. auto uses skia-pathops when it is installed')
+    parser.add_argument('--font-format', choices=['otf', 'ttf'], default='otf', help='font file format of the fonttools backend')
+    parser.add_argument('--weights', metavar='FILE', help='json list of weights to build as a family, e.g. [{"name": "Bold", "width": 44, "style": "bold.json"}]')
+    parser.add_argument('--subset-text', metavar='FILE', action='append', help='build only the chars used in the text FILE and the symbols among them, can be repeated')
+    parser.add_argument('--codepoints', metavar='LIST', action='append', help='build only these code points, e.g. U+4E00-4E8F,3002 or @FILE, can be repeated and combined with --subset-text')
+    parser.add_argument('--subset-name', default=SUBSET_NAME, help='font files of a subset build are named FontName.NAME.otf')
+    parser.add_argument('--component-cache', type=int, default=COMPONENT_CACHE_SIZE, help='outlines of repeated components each process keeps for reuse, off (0) by default')
+    parser.add_argument('--glyph-budget', type=float, help='seconds a worker may spend on one glyph before it is killed and replaced, %g by default when more than one job runs. 0 runs without the supervisor, a budget with -j 1 supervises the single worker' % DEFAULT_GLYPH_TIME_BUDGET)
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const=PROFILE_FILE, help='time every build stage, print a report and write a json summary to FILE')
+    parser.add_argument('--slowest', type=int, default=10, help='number of slowest glyphs listed by --profile')
+    parser.add_argument('--profile-dump', metavar='FILE', help='run the build under a profiler and write its output to FILE, only the main process is profiled')
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile', help='profiler used by --profile-dump')
+    args = parser.parse_args()
+
+    setComponentCache(args.component_cache)
+    GLYPH_TIME_BUDGET = args.glyph_budget
+    SUBSET_NAME = args.subset_name
+    OVERLAP_REMOVAL = args.overlaps
+    chars = subsetChars(args.subset_text or (), args.codepoints or ()) if args.subset_text or args.codepoints else None
+    if args.compile_data:
+        compileStrucData(args.data, args.compile_data)
+    else:
+        if args.weights:
+            weights = loadWeights(args.weights)
+        else:
+            weights = [(None, STROKE_WIDTH, loadStrokeStyles(args.style) if args.style else None)]
+        if args.profile:
+            setProfile(BuildProfile())
+        if args.profile_dump:
+            if args.profiler == 'pyinstrument':
+                import pyinstrument
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+            else:
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+        if args.export:
+            exportGlyphs(args.export, args.format, args.jobs, args.data, not args.restart, weights, chars)
+        elif args.backend == 'fonttools':
+            buildFontTools(args.jobs, not args.full, args.data, weights, args.font_format, chars)
+        else:
+            importGlyphs(args.jobs, not args.full, args.data, weights, chars)
+
+        if args.profile_dump:
+            if args.profiler == 'pyinstrument':
+                profiler.stop()
+                with open(args.profile_dump, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html() if args.profile_dump.endswith('.html') else profiler.output_text())
+            else:
+                profiler.disable()
+                profiler.dump_stats(args.profile_dump)
+        if args.profile:
+            with open(args.profile, 'w', encoding='utf-8') as f:
+                json.dump(PROFILE.report(args.slowest), f, ensure_ascii=False, indent=2)